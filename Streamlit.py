@@ -1,31 +1,22 @@
 import streamlit as st
 import pandas as pd
 import json
-import os
 from datetime import datetime
 
+from departure_store import get_departure_store
+from export import encode_chunks, iter_records_json, lazy_download_button
+from ids import generate_id
+from paging import page_window
+
 # Fil for lagring
 DATA_FILE = "departures.json"
 
-# Last data
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            # Konverter tilbake til liste hvis nødvendig
-            if isinstance(data, list):
-                return data
-    return []
-
-# Lagre data
-def save_data(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# Snapshot + endringslogg (departures.log.jsonl): hver endring skriver én linje.
+# Listen deles av alle økter og er indeksert på id og enhetsnummer.
+store = get_departure_store(DATA_FILE)
+departures = store.all()
 
 # Initialiser session state
-if 'departures' not in st.session_state:
-    st.session_state.departures = load_data()
-
 if 'editing_id' not in st.session_state:
     st.session_state.editing_id = None
 
@@ -74,14 +65,14 @@ with form:
 if submit:
     if not all([unit_number, destination, gate, transport_type, status]):
         st.sidebar.error("Vennligst fyll ut alle obligatoriske felt.")
-    elif st.session_state.editing_id is None and any(d['unitNumber'] == unit_number for d in st.session_state.departures):
+    elif store.unit_exists(unit_number, exclude_id=st.session_state.editing_id):
         st.sidebar.error(f"Enhetsnummer {unit_number} eksisterer allerede!")
     else:
         # Formater tid
         time_str = time.strftime("%H:%M")
 
         new_entry = {
-            "id": st.session_state.editing_id or int(datetime.now().timestamp()),
+            "id": st.session_state.editing_id or generate_id(),
             "unitNumber": unit_number,
             "destination": destination,
             "time": time_str,
@@ -91,20 +82,18 @@ if submit:
             "comment": comment if comment else None
         }
 
+        # Lagres til fil som én logglinje
         if st.session_state.editing_id is not None:
             # Oppdater eksisterende
-            idx = next(i for i, d in enumerate(st.session_state.departures) if d["id"] == st.session_state.editing_id)
-            st.session_state.departures[idx] = new_entry
+            store.update(st.session_state.editing_id, new_entry)
             st.session_state.editing_id = None
             st.session_state.edit_unit = ""
             st.success("✅ Avgang oppdatert!")
         else:
             # Ny avgang
-            st.session_state.departures.append(new_entry)
+            store.add(new_entry)
             st.success("✅ Avgang registrert!")
-
-        # Lagre til fil
-        save_data(st.session_state.departures)
+        departures = store.all()
 
 # --- Hovedside ---
 st.title("🚛 Transportsystem")
@@ -120,7 +109,8 @@ with col2:
     ])
 
 # --- Filtrering og sortering ---
-filtered = st.session_state.departures
+sort_key = "time"
+filtered = departures
 
 if search_term:
     filtered = [d for d in filtered if search_term.lower() in (d['unitNumber'] + d['destination']).lower()]
@@ -131,7 +121,7 @@ if filter_dest != "Alle destinasjoner":
 # Konverter til DataFrame for enklere visning
 df = pd.DataFrame(filtered)
 if not df.empty:
-    df = df.sort_values(by="time")
+    df = df.sort_values(by=sort_key)
 
 # --- Statistikk ---
 st.markdown("### 📊 Statistikk")
@@ -154,8 +144,12 @@ st.markdown("### 📋 Oversikt over Avganger")
 if df.empty:
     st.info("Ingen avganger registrert.")
 else:
+    # Bare gjeldende side vises, både i tabellen og som knapperader
+    start, stop = page_window(len(df), key="departures")
+    page_df = df.iloc[start:stop]
+
     # Legg til kolonner for visning
-    display_df = df.copy()
+    display_df = page_df.copy()
     display_df['type_display'] = display_df['type'].map(lambda t: f"{type_icons.get(t, '')} **{t}**")
     display_df['status_color'] = display_df['status'].map(
         lambda s: f"<span style='color:{'#27ae60' if s == 'LEVERT' else '#3498db' if s == 'LAGER' else '#e74c3c'}; font-weight:bold'>{s}</span>"
@@ -183,7 +177,7 @@ else:
     )
 
     # Handlinger for hver rad
-    for _, row in df.iterrows():
+    for _, row in page_df.iterrows():
         cols = st.columns([6, 1, 1])
         with cols[1]:
             if st.button("✏️", key=f"edit_{row['id']}"):
@@ -192,8 +186,7 @@ else:
                 st.rerun()
         with cols[2]:
             if st.button("🗑️", key=f"del_{row['id']}"):
-                st.session_state.departures = [d for d in st.session_state.departures if d['id'] != row['id']]
-                save_data(st.session_state.departures)
+                store.delete(row['id'])
                 st.success("Avgang slettet!")
                 st.rerun()
 
@@ -203,33 +196,38 @@ col1, col2, col3, col4, col5 = st.columns(5)
 
 with col1:
     if st.button("🗑️ Tøm alle"):
-        if st.session_state.departures:
+        if departures:
             if st.checkbox("Bekreft sletting av alle data", key="confirm_clear"):
-                st.session_state.departures = []
-                save_data(st.session_state.departures)
+                store.clear()
                 st.success("Alle avganger slettet!")
                 st.rerun()
         else:
             st.warning("Ingen avganger å slette.")
 
+# Filene lages først ved klikk og caches på lagerets revisjon (og utvalg og sortering)
 with col2:
-    @st.experimental_memo
-    def convert_df_to_csv(df):
-        return df.to_csv(index=False).encode('utf-8')
+    @st.cache_data(max_entries=4)
+    def convert_df_to_csv(_df, token):
+        return _df.to_csv(index=False).encode('utf-8')
 
     if not df.empty:
-        csv = convert_df_to_csv(df)
-        st.download_button("🖨️ Skriv ut / CSV", csv, f"avganger_{datetime.now().date()}.csv", "text/csv")
+        token = (store.revision, search_term, filter_dest, sort_key)
+        lazy_download_button("🖨️ Skriv ut / CSV", lambda: convert_df_to_csv(df, token), token,
+                             f"avganger_{datetime.now().date()}.csv", "text/csv",
+                             key="csv_export", prepare_label="⚙️ Lag CSV")
     else:
         st.button("🖨️ Skriv ut / CSV", disabled=True)
 
 with col3:
-    @st.experimental_memo
-    def export_json():
-        return json.dumps(st.session_state.departures, ensure_ascii=False, indent=2).encode('utf-8')
-
-    if st.session_state.departures:
-        st.download_button("💾 Backup (JSON)", export_json(), f"backup_{datetime.now().date()}.json", "application/json")
+    @st.cache_data(max_entries=2)
+    def export_json(revision):
+        return encode_chunks(iter_records_json(store.all()))
+
+    if departures:
+        revision = store.revision
+        lazy_download_button("💾 Backup (JSON)", lambda: export_json(revision), revision,
+                             f"backup_{datetime.now().date()}.json", "application/json",
+                             key="backup_export", prepare_label="⚙️ Lag backup")
     else:
         st.button("💾 Backup", disabled=True)
 
@@ -242,16 +240,10 @@ with col4:
                 overwrite = st.radio("Hvordan vil du importere?", ["Erstatt", "Legg til"])
                 if st.button("Importer nå"):
                     if overwrite == "Erstatt":
-                        st.session_state.departures = imported
+                        store.replace(imported)
                     else:
-                        existing_ids = {d['id'] for d in st.session_state.departures}
-                        added = 0
-                        for item in imported:
-                            if item['id'] not in existing_ids:
-                                st.session_state.departures.append(item)
-                                added += 1
+                        added = store.merge(imported)
                         st.success(f"{added} nye avganger lagt til.")
-                    save_data(st.session_state.departures)
                     st.success("Data importert!")
                     st.rerun()
             else:
@@ -0,0 +1,378 @@
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date
+from functools import partial
+
+from fastapi import FastAPI, File, Header, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, Field, field_validator
+
+from db import (CHANGES_PAGE_SIZE, DB_PATH, SORT_COLUMNS, ConnectionPool, add_departure, change_revision,
+                changes_since, clear_all_departures, compact_changes, delete_departure, departures_query,
+                get_departure, migrate, scope_change, update_departure)
+from importer import import_stream
+from search import search_query
+from stats import day_statistics
+
+# =======================
+# REST-API over avgangsdatabasen
+# =======================
+# Samme SQLite-skjema som app.py. Én prosess betjener alle terminalene:
+# forespørslene håndteres asynkront, mens databasearbeidet kjøres i en
+# begrenset trådpool, så et tregt kall aldri blokkerer event-loopen og
+# antall samtidige tilkoblinger holdes nede.
+#
+# Start med:  uvicorn api:app --host 0.0.0.0 --port 8000
+DB_WORKERS = 8
+MAX_PAGE_SIZE = 500
+COMPACT_INTERVAL = 600  # sekunder mellom hver kompaktering av endringsloggen
+POLL_INTERVAL = 1.0     # sekunder mellom hver sjekk etter endringer fra andre prosesser
+KEEPALIVE = 15.0        # sekunder mellom ping på åpne event-strømmer
+SUBSCRIBER_QUEUE = 1000
+DAY_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transportsystem")
+
+pool = ConnectionPool(DB_PATH)
+migrate(pool)
+executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+log = logging.getLogger(__name__)
+
+
+async def run_db(fn, *args, **kwargs):
+    """Kjører et blokkerende databasekall i trådpoolen."""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+# Bakgrunnsoppgavene må overleve feil som "database is locked": én feil
+# logges, og oppgaven prøver igjen neste runde i stedet for å dø stille.
+async def _compact_periodically():
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL)
+        try:
+            await run_db(compact_changes, pool)
+        except Exception:
+            log.exception("Kompaktering av endringsloggen feilet; prøver igjen om %s s", COMPACT_INTERVAL)
+
+
+# =======================
+# Direkte oppdateringer (Server-Sent Events)
+# =======================
+# Én oppgave leser endringsloggen og deler hver endring ut til køen til
+# alle tilkoblede tavler; databasen spørres altså én gang per endring, ikke
+# én gang per klient. Endringer gjort via API-et vekker den med en gang,
+# endringer fra Streamlit-appene fanges opp innen POLL_INTERVAL. En klient
+# kan følge én driftsdag og får da bare endringene som angår den dagen.
+class _Subscriber:
+    def __init__(self, day=None):
+        self.day = day
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+
+    def close(self):
+        # Tøm køen og legg inn None: strømmen avsluttes, og nettleseren
+        # kobler til igjen med Last-Event-ID og henter det den mangler.
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ChangeBroadcaster:
+    def __init__(self, pool, interval=POLL_INTERVAL):
+        self.pool = pool
+        self.interval = interval
+        self.revision = 0
+        self.subscribers = set()
+        self._wake = asyncio.Event()
+
+    def subscribe(self, day=None):
+        subscriber = _Subscriber(day)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def wake(self):
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            try:
+                self.revision = await run_db(change_revision, self.pool)
+                break
+            except Exception:
+                log.exception("Kunne ikke lese endringsloggen; prøver igjen")
+                await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._publish()
+            except Exception:
+                # self.revision er bare flyttet forbi det som er delt ut,
+                # så neste runde fortsetter der denne stoppet
+                log.exception("Kunne ikke dele ut endringer; prøver igjen")
+
+    async def _publish(self):
+        while True:
+            result = await run_db(changes_since, self.pool, self.revision)
+            if result["reset"]:
+                # Vi har ligget bak kompakteringsgrensen: alle må synke på nytt
+                for subscriber in list(self.subscribers):
+                    subscriber.close()
+                self.subscribers.clear()
+            for change in result["changes"]:
+                self._fan_out(change)
+            self.revision = result["revision"]
+            if not result["has_more"]:
+                return
+
+    def _fan_out(self, change):
+        for subscriber in list(self.subscribers):
+            scoped = scope_change(change, subscriber.day)
+            if scoped is None:
+                continue
+            try:
+                subscriber.queue.put_nowait(scoped)
+            except asyncio.QueueFull:
+                # For treg klient: kobles fra og henter resten ved gjenoppkobling
+                self.unsubscribe(subscriber)
+                subscriber.close()
+
+
+broadcaster = ChangeBroadcaster(pool)
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+async def _event_stream(since, day=None):
+    subscriber = broadcaster.subscribe(day)
+    try:
+        # Først alt klienten mangler, deretter endringene etter hvert som de kommer
+        revision = since
+        while True:
+            result = await run_db(changes_since, pool, revision, day=day)
+            if result["reset"]:
+                yield _sse("reset", {"revision": result["revision"]})
+                revision = 0
+                continue
+            for change in result["changes"]:
+                yield _sse("change", change, change["rev"])
+            revision = result["revision"]
+            if not result["has_more"]:
+                break
+        yield _sse("ready", {"revision": revision}, revision)
+
+        while True:
+            try:
+                change = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if change is None:
+                return
+            if change["rev"] <= revision:
+                continue  # allerede sendt i innhentingen
+            revision = change["rev"]
+            yield _sse("change", change, revision)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    tasks = [asyncio.create_task(_compact_periodically()), asyncio.create_task(broadcaster.run())]
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(title="Transportsystem API", lifespan=lifespan)
+
+
+def _fetch_all(query, args):
+    cur = pool.reader().execute(query, args)
+    columns = [col[0] for col in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+# Markøren for neste side er siste rads sorteringsverdier (time/dest) eller
+# antall rader allerede vist (rank), pakket som en ugjennomsiktig streng.
+def _encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def _decode_cursor(cursor, sort):
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(400, "Ugyldig markør")
+    # Markøren kommer fra klienten og kan være redigert eller fra en annen sortering
+    if sort == "rank":
+        valid = type(value) is int and value >= 0
+    else:
+        valid = (isinstance(value, list) and len(value) == len(SORT_COLUMNS[sort])
+                 and all(type(v) in (str, int, float) for v in value))
+    if not valid:
+        raise HTTPException(400, "Ugyldig markør")
+    return value
+
+
+class DepartureIn(BaseModel):
+    service_date: str = Field(pattern=r"^\d{4}-\d{2}-\d{2}$")
+    unit_number: str = Field(min_length=1)
+    destination: str = Field(min_length=1)
+    departure_time: str = Field(pattern=r"^\d{2}:\d{2}$")
+    gate: str = Field(min_length=1)
+    type: str = Field(min_length=1)
+    status: str = "Planlagt"
+    comment: str = ""
+
+    @field_validator("unit_number")
+    @classmethod
+    def _normalize_unit(cls, value):
+        return value.strip().upper()
+
+
+# --- Lesing ---
+@app.get("/api/departures")
+async def list_departures(
+    day: str = Query(default_factory=lambda: date.today().isoformat()),
+    q: str = "",
+    dest: str = "",
+    sort: str = "time",
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+):
+    """Én side av dagens avganger, eventuelt filtrert på fritekst og destinasjon."""
+    if sort == "rank" and not q.strip():
+        sort = "time"  # treffrangering gir bare mening ved søk
+    if sort not in SORT_COLUMNS and sort != "rank":
+        raise HTTPException(400, f"Ukjent sortering: {sort}")
+    after = _decode_cursor(cursor, sort) if cursor else None
+    # Én rad ekstra forteller om det finnes en neste side
+    if q.strip():
+        query, args = search_query(q, day, dest, sort, limit + 1, after)
+    else:
+        query, args = departures_query(day, dest, sort, after, limit + 1)
+    rows = await run_db(_fetch_all, query, args)
+    items, has_next = rows[:limit], len(rows) > limit
+    next_cursor = None
+    if has_next:
+        if sort == "rank":
+            next_cursor = _encode_cursor((after or 0) + limit)
+        else:
+            next_cursor = _encode_cursor([items[-1][col] for col in SORT_COLUMNS[sort]])
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/api/departures/{row_id}")
+async def read_departure(row_id: int):
+    departure = await run_db(get_departure, pool, row_id)
+    if departure is None:
+        raise HTTPException(404, "Fant ikke avgangen")
+    return departure
+
+
+@app.get("/api/changes")
+async def changes(since: int = Query(0, ge=0), limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=CHANGES_PAGE_SIZE),
+                  day: str = Query(None, pattern=DAY_PATTERN)):
+    """Endringer etter revisjon `since` (se db.changes_since), eventuelt for én dag.
+
+    Ved reset=true må klienten forkaste sin kopi og hente på nytt med since=0.
+    """
+    return await run_db(changes_since, pool, since, limit, day)
+
+
+@app.get("/api/events")
+async def events(since: int = Query(0, ge=0), day: str = Query(None, pattern=DAY_PATTERN),
+                 last_event_id: str = Header(None)):
+    """Endringer som Server-Sent Events: "change" per avgang, "ready" når
+    klienten er à jour, og "reset" når den må forkaste sin kopi. Med `day`
+    bare avgangene på den driftsdagen, som tavlen viser."""
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)  # nettleseren kobler til igjen der den slapp
+    return StreamingResponse(
+        _event_stream(since, day),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/stats")
+async def stats(day: str = Query(default_factory=lambda: date.today().isoformat())):
+    return await run_db(day_statistics, pool, day)
+
+
+# --- Endringer ---
+@app.post("/api/departures", status_code=201)
+async def create_departure(departure: DepartureIn):
+    row_id, err = await run_db(add_departure, pool, departure.model_dump())
+    if err == "duplicate":
+        raise HTTPException(409, "Avgangen finnes allerede for denne tiden og destinasjonen")
+    broadcaster.wake()
+    return await run_db(get_departure, pool, row_id)
+
+
+@app.put("/api/departures/{row_id}")
+async def replace_departure(row_id: int, departure: DepartureIn):
+    ok, err = await run_db(update_departure, pool, row_id, departure.model_dump())
+    if err == "not_found":
+        raise HTTPException(404, "Fant ikke avgangen")
+    if err == "duplicate":
+        raise HTTPException(409, "Avgangen finnes allerede for denne tiden og destinasjonen")
+    broadcaster.wake()
+    return await run_db(get_departure, pool, row_id)
+
+
+@app.delete("/api/departures/{row_id}", status_code=204)
+async def remove_departure(row_id: int):
+    if not await run_db(delete_departure, pool, row_id):
+        raise HTTPException(404, "Fant ikke avgangen")
+    broadcaster.wake()
+    return Response(status_code=204)
+
+
+@app.delete("/api/departures", status_code=204)
+async def remove_all_departures(day: str = Query(..., pattern=DAY_PATTERN)):
+    """Sletter alle avgangene på én driftsdag; historikken ellers røres ikke."""
+    await run_db(clear_all_departures, pool, day)
+    broadcaster.wake()
+    return Response(status_code=204)
+
+
+@app.post("/api/upload")
+async def upload(file: UploadFile = File(...)):
+    """Bulk-import av en JSON-liste eller JSON Lines-fil (også .gz)."""
+    source = gzip.GzipFile(fileobj=file.file, mode="rb") if (file.filename or "").endswith(".gz") else file.file
+    try:
+        inserted, skipped = await run_db(import_stream, pool, source)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    broadcaster.wake()
+    return {"inserted": inserted, "skipped": skipped}
+
+
+# Nettsiden i transportsystem/ serveres fra roten, etter API-rutene
+app.mount("/", StaticFiles(directory=STATIC_DIR, html=True), name="static")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,22 +1,24 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 from io import BytesIO
 import json
+import gzip
+
+from columnar import categorize
+from db import (DB_PATH, SORT_COLUMNS, add_departure, clear_all_departures, data_revision, day_revision,
+                departures_query, get_pool, range_revision)
+from export import (BACKUP_FORMATS, database_backup, encode_chunks, iter_departures_csv, iter_departures_json,
+                    lazy_download_button)
+from importer import import_stream
+from search import search_departures
+from stats import day_statistics
+from table_render import render_departure_table
 
 # =======================
 # App config
 # =======================
 st.set_page_config(page_title="Transportsystem", page_icon="🚛", layout="wide")
-DB_PATH = "data.db"
-
-# --- Auto-refresh hvert 3. sekund ---
-try:
-    from streamlit_autorefresh import st_autorefresh
-    st_autorefresh(interval=3000, key="data_refresh")
-except ImportError:
-    pass
 
 # =======================
 # Språkstøtte (NO/EN)
@@ -40,15 +42,30 @@ TXT = {
         "yes": "Ja",
         "no": "Nei",
         "filter": "Filtrer",
-        "search": "Søk på enhet eller destinasjon...",
+        "search": "Søk på enhet, luke, destinasjon eller kommentar...",
         "clear": "Nullstill",
         "sort": "Sorter",
         "sort_time": "Tid (kommende først)",
         "sort_dest": "Destinasjon (A–Å)",
+        "sort_rank": "Beste treff",
+        "page_size": "Rader per side",
+        "page": "Side",
+        "prev_page": "◀ Forrige",
+        "next_page": "Neste ▶",
         "validation": "⚠️ Vennligst fyll ut alle obligatoriske felt.",
         "duplicate": "⚠️ Denne enheten eksisterer allerede for denne tiden og destinasjon.",
         "export_csv": "📄 Eksporter til CSV",
-        "export_json": "💾 Last ned backup (JSON)",
+        "prepare_csv": "⚙️ Lag CSV",
+        "prepare_backup": "⚙️ Lag backup",
+        "export_range": "Periode for eksport",
+        "backup_format": "Backupformat",
+        "backup_formats": {
+            "json": "JSON (lesbar)",
+            "compact": "JSON (kompakt)",
+            "gzip": "JSON (kompakt, gzip)",
+            "sqlite": "Hele databasen (.db)",
+        },
+        "export_json": "💾 Last ned backup",
         "import_json": "📂 Last opp backup (JSON)",
         "clear_all": "🗑️ Tøm alle avganger",
         "print": "🖨️ Skriv ut",
@@ -59,7 +76,7 @@ TXT = {
         "trailers": "Traller",
         "modules": "Moduler",
         "destinations": "Destinasjoner",
-        "auto_refresh": "🔄 Auto-oppdatering aktiv (hvert 3. sekund)",
+        "auto_refresh": "🔄 Oppdateres automatisk ved endringer",
         "service_date": "Dato",
         "today": "I dag",
         "yesterday": "◀ I går",
@@ -82,15 +99,30 @@ TXT = {
         "yes": "Yes",
         "no": "No",
         "filter": "Filter",
-        "search": "Search by unit or destination...",
+        "search": "Search by unit, gate, destination or comment...",
         "clear": "Clear",
         "sort": "Sort",
         "sort_time": "Time (upcoming first)",
         "sort_dest": "Destination (A–Z)",
+        "sort_rank": "Best match",
+        "page_size": "Rows per page",
+        "page": "Page",
+        "prev_page": "◀ Previous",
+        "next_page": "Next ▶",
         "validation": "⚠️ Please fill all required fields.",
         "duplicate": "⚠️ This unit already exists for this time and destination.",
         "export_csv": "📄 Export to CSV",
-        "export_json": "💾 Download backup (JSON)",
+        "prepare_csv": "⚙️ Build CSV",
+        "prepare_backup": "⚙️ Build backup",
+        "export_range": "Export period",
+        "backup_format": "Backup format",
+        "backup_formats": {
+            "json": "JSON (readable)",
+            "compact": "JSON (compact)",
+            "gzip": "JSON (compact, gzip)",
+            "sqlite": "Full database (.db)",
+        },
+        "export_json": "💾 Download backup",
         "import_json": "📂 Upload backup (JSON)",
         "clear_all": "🗑️ Clear all departures",
         "print": "🖨️ Print",
@@ -101,7 +133,7 @@ TXT = {
         "trailers": "Trailers",
         "modules": "Modules",
         "destinations": "Destinations",
-        "auto_refresh": "🔄 Auto-refresh enabled (every 3s)",
+        "auto_refresh": "🔄 Refreshes automatically on changes",
         "service_date": "Date",
         "today": "Today",
         "yesterday": "◀ Yesterday",
@@ -369,96 +401,40 @@ inject_modern_css()
 # =======================
 # Database
 # =======================
-def get_db():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
-def init_db():
-    with get_db() as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS departures (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            service_date TEXT NOT NULL,
-            unit_number TEXT NOT NULL,
-            destination TEXT NOT NULL,
-            departure_time TEXT NOT NULL,
-            gate TEXT NOT NULL,
-            type TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'Planlagt',
-            comment TEXT,
-            created_at TEXT NOT NULL
-        )
-        """)
-        conn.commit()
-
-init_db()
+pool = get_pool(DB_PATH)
 
 # =======================
 # Cache
 # =======================
-@st.cache_data(ttl=2)
-def load_departures(day: str, search: str = "", dest_filter: str = "", sort_key: str = "time"):
-    where = "service_date = ?"
-    args = [day]
-    if search:
-        where += " AND (unit_number LIKE ? OR destination LIKE ?)"
-        args.extend([f"%{search}%", f"%{search}%"])
-    if dest_filter:
-        where += " AND destination = ?"
-        args.append(dest_filter)
-    order = "departure_time" if sort_key == "time" else "destination"
-    query = f"SELECT * FROM departures WHERE {where} ORDER BY {order}"
-    df = pd.read_sql_query(query, get_db(), params=args)
-    return df
-
-def invalidate_cache():
-    load_departures.clear()
-
-# =======================
-# CRUD
-# =======================
-def add_departure(data):
-    with get_db() as conn:
-        dup = conn.execute("""
-            SELECT 1 FROM departures
-            WHERE service_date = ? AND unit_number = ? AND destination = ? AND departure_time = ?
-        """, (data["service_date"], data["unit_number"], data["destination"], data["departure_time"])).fetchone()
-        if dup:
-            return False, "duplicate"
-        conn.execute("""
-            INSERT INTO departures (service_date, unit_number, destination, departure_time, gate, type, status, comment, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (*data.values(), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-    invalidate_cache()
-    return True, None
-
-def update_departure(row_id, data):
-    with get_db() as conn:
-        dup = conn.execute("""
-            SELECT 1 FROM departures
-            WHERE id != ? AND service_date = ? AND unit_number = ? AND destination = ? AND departure_time = ?
-        """, (row_id, data["service_date"], data["unit_number"], data["destination"], data["departure_time"])).fetchone()
-        if dup:
-            return False, "duplicate"
-        conn.execute("""
-            UPDATE departures SET service_date=?, unit_number=?, destination=?, departure_time=?, gate=?, type=?, status=?, comment=?
-            WHERE id=?
-        """, (*data.values(), row_id))
-        conn.commit()
-    invalidate_cache()
-    return True, None
-
-def delete_departure(row_id):
-    with get_db() as conn:
-        conn.execute("DELETE FROM departures WHERE id = ?", (row_id,))
-        conn.commit()
-    invalidate_cache()
-
-def clear_all_departures():
-    with get_db() as conn:
-        conn.execute("DELETE FROM departures")
-        conn.commit()
-    invalidate_cache()
+# Nøkkelen inkluderer dagens revisjon: en endring gir en ny nøkkel for den
+# berørte dagen, mens alle andre dager beholder sine oppføringer.
+@st.cache_data(max_entries=256)
+def load_departures(day: str, revision: int, search: str = "", dest_filter: str = "", sort_key: str = "time",
+                    after: tuple = None, limit: int = None):
+    if search.strip():
+        return categorize(search_departures(pool, search, day=day, dest_filter=dest_filter, sort_key=sort_key,
+                                            limit=limit, after=after))
+    query, args = departures_query(day, dest_filter, sort_key, after, limit)
+    # Kategorier for destinasjon/type/status: cachen holder mange utsnitt
+    return categorize(pd.read_sql_query(query, pool.reader(), params=args))
+
+@st.cache_data(max_entries=256)
+def load_statistics(day: str, revision: int):
+    return day_statistics(pool, day)
+
+# Ferdige eksportfiler kan være store, så bare noen få holdes i cachen
+@st.cache_data(max_entries=8)
+def build_csv(start_day: str, end_day: str, dest_filter: str, revision: int):
+    return encode_chunks(iter_departures_csv(pool, start_day, end_day, dest_filter))
+
+@st.cache_data(max_entries=8)
+def build_json_backup(start_day: str, end_day: str, dest_filter: str, revision: int, fmt: str):
+    chunks = iter_departures_json(pool, start_day, end_day, dest_filter, compact=fmt != "json")
+    return encode_chunks(chunks, compress=fmt == "gzip")
+
+@st.cache_data(max_entries=2)
+def build_database_backup(revision: int):
+    return database_backup(pool)
 
 # =======================
 # State
@@ -489,21 +465,26 @@ if picked != st.session_state.service_date:
     st.session_state.service_date = picked
 
 day_str = st.session_state.service_date.strftime("%Y-%m-%d")
+day_rev = day_revision(pool, day_str)
+
+# Fragmentet sjekker bare dagens revisjon hvert 3. sekund, og hele siden
+# kjøres på nytt kun når noen faktisk har endret denne dagen.
+@st.fragment(run_every=3)
+def watch_for_changes(day, seen_revision):
+    if day_revision(pool, day) != seen_revision:
+        st.rerun()
 
-df = load_departures(day_str)
-total = len(df)
-trains = len(df[df["type"].str.contains("Tog|Train", case=False)])
-cars = len(df[df["type"].str.contains("Bil|Car", case=False)])
-trailers = len(df[df["type"].str.contains("Tralle|Trailer", case=False)])
-modules = len(df[df["type"].str.contains("Modul|Module", case=False)])
+watch_for_changes(day_str, day_rev)
+
+stats = load_statistics(day_str, day_rev)
 
 st.sidebar.markdown(f"""
 <div class='stats-container'>
-  <div class='stat-card'><div class='stat-number'>{total}</div><div class='stat-label'>{TXT['total']}</div></div>
-  <div class='stat-card type-tog'><div class='stat-number'>{trains}</div><div class='stat-label'>{TXT['trains']}</div></div>
-  <div class='stat-card type-bil'><div class='stat-number'>{cars}</div><div class='stat-label'>{TXT['cars']}</div></div>
-  <div class='stat-card type-tralle'><div class='stat-number'>{trailers}</div><div class='stat-label'>{TXT['trailers']}</div></div>
-  <div class='stat-card type-modul'><div class='stat-number'>{modules}</div><div class='stat-label'>{TXT['modules']}</div></div>
+  <div class='stat-card'><div class='stat-number'>{stats['total']}</div><div class='stat-label'>{TXT['total']}</div></div>
+  <div class='stat-card type-tog'><div class='stat-number'>{stats['trains']}</div><div class='stat-label'>{TXT['trains']}</div></div>
+  <div class='stat-card type-bil'><div class='stat-number'>{stats['cars']}</div><div class='stat-label'>{TXT['cars']}</div></div>
+  <div class='stat-card type-tralle'><div class='stat-number'>{stats['trailers']}</div><div class='stat-label'>{TXT['trailers']}</div></div>
+  <div class='stat-card type-modul'><div class='stat-number'>{stats['modules']}</div><div class='stat-label'>{TXT['modules']}</div></div>
 </div>
 """, unsafe_allow_html=True)
 st.sidebar.markdown(f"<p style='text-align:center;margin-top:20px;color:#7f8c8d;'>{TXT['auto_refresh']}</p>", unsafe_allow_html=True)
@@ -546,7 +527,7 @@ with st.form("add_form"):
         if not all([unit, dest, time_val, gate, typ]):
             st.warning(TXT["validation"])
         else:
-            success, err = add_departure({
+            success, err = add_departure(pool, {
                 "service_date": day_str,
                 "unit_number": unit,
                 "destination": dest,
@@ -572,18 +553,30 @@ st.markdown(f"<h2>📋 {TXT['list']}</h2>", unsafe_allow_html=True)
 
 search_term = st.text_input(TXT["search"], key="search_input")
 dest_filter = st.selectbox(TXT["destination"], ["Alle"] + DESTINATIONS, key="dest_filter")
-sort_order = st.radio(TXT["sort"], [TXT["sort_time"], TXT["sort_dest"]], horizontal=True, key="sort_order")
-
-# Filtrer data
-filtered_df = df.copy()
-if search_term:
-    filtered_df = filtered_df[filtered_df.apply(lambda r: search_term.lower() in r["unit_number"].lower() or search_term.lower() in r["destination"].lower(), axis=1)]
-if dest_filter != "Alle":
-    filtered_df = filtered_df[filtered_df["destination"] == dest_filter]
-if sort_order == TXT["sort_dest"]:
-    filtered_df = filtered_df.sort_values("destination")
-else:
-    filtered_df = filtered_df.sort_values("departure_time")
+sort_order = st.radio(TXT["sort"], [TXT["sort_time"], TXT["sort_dest"], TXT["sort_rank"]], horizontal=True, key="sort_order")
+
+# Filtrering og sortering gjøres i SQL, så vi får bare radene som skal vises
+search_term = search_term.strip()
+view = {
+    "search": search_term,
+    "dest_filter": "" if dest_filter == "Alle" else dest_filter,
+    "sort_key": {TXT["sort_dest"]: "dest", TXT["sort_rank"]: "rank"}.get(sort_order, "time"),
+}
+if view["sort_key"] == "rank" and not search_term:
+    view["sort_key"] = "time"
+
+# Keyset-paginering: page_cursors er en stabel med markører, én per side vi
+# har bladd forbi. Den nullstilles når dag, filter, sortering eller sidestørrelse endres.
+page_size = st.selectbox(TXT["page_size"], [25, 50, 100, 250], index=1, key="page_size")
+view_key = (day_str, page_size, *view.values())
+if st.session_state.get("page_view") != view_key:
+    st.session_state.page_view = view_key
+    st.session_state.page_cursors = [None]
+cursors = st.session_state.page_cursors
+
+page_df = load_departures(day_str, day_rev, **view, after=cursors[-1], limit=page_size + 1)
+has_next = len(page_df) > page_size
+filtered_df = page_df.iloc[:page_size]
 
 # =======================
 # Tabellvisning
@@ -592,29 +585,27 @@ if filtered_df.empty:
     st.info(TXT["none"])
 else:
     st.markdown("<div class='table-container'>", unsafe_allow_html=True)
-    table_html = "<table><thead><tr><th>Enhetsnummer</th><th>Destinasjon</th><th>Tid</th><th>Gate</th><th>Type</th><th>Status</th><th>Kommentar</th><th>Handlinger</th></tr></thead><tbody>"
-    for _, row in filtered_df.iterrows():
-        tc = "#e74c3c" if "Tog" in row["type"] else "#f39c12" if "Bil" in row["type"] else "#3498db" if "Tralle" in row["type"] else "#9b59b6"
-        sc = "#27ae60" if row["status"] == "LEVERT" else "#3498db" if row["status"] == "LAGER" else "#e67e22"
-        table_html += f"""
-        <tr>
-          <td>{row['unit_number']}</td>
-          <td>{row['destination']}</td>
-          <td>{row['departure_time']}</td>
-          <td>{row['gate']}</td>
-          <td><span style='color:{tc};font-weight:bold'>{row['type']}</span></td>
-          <td><span style='color:{sc};font-weight:bold'>{row['status']}</span></td>
-          <td>{row['comment'] or '—'}</td>
-          <td class='action-buttons'>
-            <button class='btn btn-secondary' onclick='edit({row['id']})'>✏️ {TXT['edit']}</button>
-            <button class='btn btn-danger' onclick='del({row['id']})'>🗑️ {TXT['delete']}</button>
-          </td>
-        </tr>
-        """
-    table_html += "</tbody></table>"
+    table_html = render_departure_table(filtered_df, TXT["edit"], TXT["delete"])
     st.markdown(table_html, unsafe_allow_html=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
+if len(cursors) > 1 or has_next:
+    p1, p2, p3 = st.columns([1, 2, 1])
+    with p1:
+        if st.button(TXT["prev_page"], disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with p2:
+        st.markdown(f"<p style='text-align:center'>{TXT['page']} {len(cursors)}</p>", unsafe_allow_html=True)
+    with p3:
+        if st.button(TXT["next_page"], disabled=not has_next, use_container_width=True):
+            if view["sort_key"] == "rank":
+                cursors.append((cursors[-1] or 0) + page_size)
+            else:
+                last_row = filtered_df[SORT_COLUMNS[view["sort_key"]]].tail(1)
+                cursors.append(next(last_row.itertuples(index=False, name=None)))
+            st.rerun()
+
 # =======================
 # Systemhandlinger
 # =======================
@@ -625,7 +616,7 @@ col1, col2, col3, col4, col5 = st.columns(5)
 with col1:
     if st.button(TXT["clear_all"], use_container_width=True):
         if st.session_state.get("confirm_clear"):
-            clear_all_departures()
+            clear_all_departures(pool)
             st.success("✅ Alt tømt!")
             st.session_state.confirm_clear = False
         else:
@@ -633,34 +624,52 @@ with col1:
             st.warning("Trykk igjen for å bekrefte.")
 with col2:
     st.markdown(f"<button class='btn btn-secondary' onclick='window.print()' style='width:100%'>{TXT['print']}</button>", unsafe_allow_html=True)
+# Eksport og backup lages først ved klikk, for en valgfri periode (med
+# destinasjonsfilteret), og caches på periodens revisjon
 with col3:
-    csv = filtered_df.to_csv(index=False).encode("utf-8")
-    st.download_button(TXT["export_csv"], csv, f"avganger_{day_str}.csv", "text/csv", use_container_width=True)
+    export_range = st.date_input(TXT["export_range"], (st.session_state.service_date,) * 2, key="export_range")
+    if len(export_range) == 2:
+        start_day, end_day = (d.strftime("%Y-%m-%d") for d in export_range)
+    else:
+        start_day = end_day = export_range[0].strftime("%Y-%m-%d") if export_range else day_str
+    range_rev = range_revision(pool, start_day, end_day)
+    period = start_day if start_day == end_day else f"{start_day}_{end_day}"
+    lazy_download_button(
+        TXT["export_csv"], lambda: build_csv(start_day, end_day, view["dest_filter"], range_rev),
+        (start_day, end_day, view["dest_filter"], range_rev), f"avganger_{period}.csv", "text/csv",
+        key="csv_export", prepare_label=TXT["prepare_csv"],
+    )
 with col4:
-    json_str = filtered_df.to_json(orient="records", indent=2, force_ascii=False)
-    st.download_button(TXT["export_json"], json_str, f"backup_{day_str}.json", "application/json", use_container_width=True)
+    backup_format = st.selectbox(TXT["backup_format"], list(BACKUP_FORMATS), format_func=TXT["backup_formats"].get,
+                                 key="backup_format")
+    extension, mime = BACKUP_FORMATS[backup_format]
+    if backup_format == "sqlite":
+        # Online backup-API: konsistent kopi av hele databasen, uten pandas
+        db_rev = data_revision(pool)
+        token = (backup_format, db_rev)
+        build = lambda: build_database_backup(db_rev)
+        file_name = f"backup_{date.today()}{extension}"
+    else:
+        token = (backup_format, start_day, end_day, view["dest_filter"], range_rev)
+        build = lambda: build_json_backup(start_day, end_day, view["dest_filter"], range_rev, backup_format)
+        file_name = f"backup_{period}{extension}"
+    lazy_download_button(TXT["export_json"], build, token, file_name, mime, key="backup_export",
+                         prepare_label=TXT["prepare_backup"])
 with col5:
-    uploaded = st.file_uploader(TXT["import_json"], type=["json"], label_visibility="collapsed")
+    uploaded = st.file_uploader(TXT["import_json"], type=["json", "jsonl", "gz"], label_visibility="collapsed")
     if uploaded:
-        try:
-            imported = pd.read_json(uploaded)
-            count = 0
-            for _, r in imported.iterrows():
-                add_departure({
-                    "service_date": r["service_date"],
-                    "unit_number": r["unit_number"],
-                    "destination": r["destination"],
-                    "departure_time": r["departure_time"],
-                    "gate": r["gate"],
-                    "type": r["type"],
-                    "status": r.get("status", "Planlagt"),
-                    "comment": r.get("comment", "")
-                })
-                count += 1
-            st.success(f"✅ {count} avganger importert.")
-        except Exception as e:
-            st.error(f"Feil: {e}")
-
+        file_id = f"{uploaded.name}_{uploaded.size}"
+        if st.session_state.get("last_uploaded_file") != file_id:
+            try:
+                bar = st.progress(0.0)
+                # Komprimert backup pakkes ut underveis
+                source = gzip.GzipFile(fileobj=uploaded) if uploaded.name.endswith(".gz") else uploaded
+                inserted, skipped = import_stream(pool, source, progress=bar.progress)
+                bar.empty()
+                st.session_state.last_uploaded_file = file_id
+                st.success(f"✅ {inserted} avganger importert, {skipped} hoppet over.")
+            except Exception as e:
+                st.error(f"Feil: {e}")
 st.markdown("</section>", unsafe_allow_html=True)
 st.markdown("</div>", unsafe_allow_html=True)  # main-content
 
@@ -1,26 +1,33 @@
 import streamlit as st
 import pandas as pd
-import json
-import os
+import gzip
 from datetime import datetime
 
+from columnar import DepartureTable
+from departure_store import get_departure_store
+from export import BACKUP_FORMATS, encode_chunks, iter_records_csv, iter_records_json, lazy_download_button
+from ids import generate_id
+from jsonstream import batched, iter_json_records
+from paging import page_window
+
 # --- Hjelpefunksjon: Last opp JSON ---
 def _load_and_apply_json(uploaded_file, file_id):
     try:
-        uploaded_data = json.load(uploaded_file)
-        if isinstance(uploaded_data, list):
-            for item in uploaded_data:
-                if item.get("status") == "I lager":
-                    item["status"] = "Lager"
-                if item.get("status") == "Planlagt":
-                    item["status"] = "Planlaget"
-            st.session_state.departures = uploaded_data
-            save_data(st.session_state.departures)
-            st.session_state.last_uploaded_file = file_id
-            st.toast("✅ Data lastet opp!", icon="🎉")
-            st.rerun()
-        else:
-            st.error("Ugyldig format: Forventet liste av avganger.")
+        # Leses inkrementelt (JSON-liste eller JSON Lines) i stedet for json.load;
+        # komprimert backup pakkes ut underveis
+        bar = st.progress(0.0)
+        uploaded_data = []
+        source = gzip.GzipFile(fileobj=uploaded_file) if uploaded_file.name.endswith(".gz") else uploaded_file
+        for batch in batched(iter_json_records(source), 1000):
+            if not all(isinstance(item, dict) for item in batch):
+                raise ValueError("Ugyldig format: Forventet liste av avganger.")
+            uploaded_data.extend(batch)
+            bar.progress(min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0))
+        bar.empty()
+        store.replace(uploaded_data)
+        st.session_state.last_uploaded_file = file_id
+        st.toast("✅ Data lastet opp!", icon="🎉")
+        st.rerun()
     except Exception as e:
         st.error(f"Feil ved lasting av JSON: {e}")
 
@@ -153,37 +160,34 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Hjelpefunksjoner: Lagring og lasting ---
-def load_data():
-    if os.path.exists(DATA_FILE_JSON):
-        try:
-            with open(DATA_FILE_JSON, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for item in data:
-                if item.get("status") == "I lager":
-                    item["status"] = "Lager"
-                if item.get("status") == "Planlagt":
-                    item["status"] = "Planlaget"
-            return data
-        except Exception as e:
-            st.warning(f"Kunne ikke lese lokal JSON-fil: {e}")
-            return []
-    return []
-
-def save_data(data):
-    try:
-        with open(DATA_FILE_JSON, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        df = pd.DataFrame(data)
-        df.to_csv(DATA_FILE_CSV, index=False, encoding='utf-8')
-        return True
-    except Exception as e:
-        st.error(f"Lagringsfeil: {e}")
-        return False
+# avganger.json er snapshot; hver endring skrives som én linje i
+# avganger.log.jsonl, og CSV-filen oppdateres når loggen kompakteres.
+# Listen holdes én gang i prosessen og deles av alle økter.
+def _write_csv(records):
+    pd.DataFrame(records).to_csv(DATA_FILE_CSV, index=False, encoding='utf-8')
+
+def _normalize_status(item):
+    if item.get("status") == "I lager":
+        item["status"] = "Lager"
+    if item.get("status") == "Planlagt":
+        item["status"] = "Planlaget"
+
+try:
+    store = get_departure_store(DATA_FILE_JSON, _write_csv, _normalize_status)
+except Exception as e:
+    # Ikke fortsett med tom liste: neste lagring ville overskrevet filen
+    st.error(f"Kunne ikke lese lokal JSON-fil: {e}")
+    st.stop()
+
+# Typet, kolonnevis kopi for søk, filter og statistikk; bygges på nytt bare
+# når lageret har endret seg.
+@st.cache_resource(max_entries=1)
+def departure_table(revision):
+    return DepartureTable(store.all())
+
+table = departure_table(store.revision)
 
 # --- Initialiser session_state ---
-if 'departures' not in st.session_state:
-    st.session_state.departures = load_data()
-
 if 'edit_mode' not in st.session_state:
     st.session_state.edit_mode = None
 
@@ -191,15 +195,18 @@ if 'last_uploaded_file' not in st.session_state:
     st.session_state.last_uploaded_file = None
 
 # --- Hjelpefunksjoner ---
-def generate_id():
-    return int(datetime.now().timestamp())
+CSV_COLUMNS = ["id", "unitNumber", "destination", "time", "gate", "type", "status", "comment"]
 
-def export_to_csv(data):
-    df = pd.DataFrame(data)
-    return df.to_csv(index=False, encoding='utf-8')
+# Lages først når noen ber om filen, og caches på lagerets revisjon
+@st.cache_data(max_entries=2)
+def export_to_csv(revision):
+    return encode_chunks(iter_records_csv(store.all(), CSV_COLUMNS))
 
-def backup_data():
-    return json.dumps(st.session_state.departures, indent=2, ensure_ascii=False)
+BACKUP_LABELS = {"json": "JSON (lesbar)", "compact": "JSON (kompakt)", "gzip": "JSON (kompakt, gzip)"}
+
+@st.cache_data(max_entries=3)
+def backup_data(revision, fmt):
+    return encode_chunks(iter_records_json(store.all(), compact=fmt != "json"), compress=fmt == "gzip")
 
 # --- Ikonmapping ---
 type_icons = {"Tog": "🚂", "Bil": "🚗", "Tralle": "🛒", "Modul": "📦"}
@@ -221,7 +228,7 @@ with st.sidebar:
     st.divider()
 
     if st.session_state.edit_mode:
-        dep = next((d for d in st.session_state.departures if d['id'] == st.session_state.edit_mode), None)
+        dep = store.get(st.session_state.edit_mode)
         if dep:
             st.subheader("✏️ Rediger Avgang")
             with st.form("edit_form"):
@@ -245,11 +252,10 @@ with st.sidebar:
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.form_submit_button("✅ Oppdater"):
-                        dep.update({
+                        store.update(dep['id'], {
                             'unitNumber': e_unit, 'destination': e_dest, 'time': e_time.strftime("%H:%M"),
                             'gate': e_gate, 'type': e_type, 'status': e_status, 'comment': e_comment or None
                         })
-                        save_data(st.session_state.departures)
                         st.session_state.edit_mode = None
                         st.toast("🔁 Oppdatert!")
                         st.rerun()
@@ -271,10 +277,10 @@ with st.sidebar:
             if st.form_submit_button("✅ Registrer"):
                 if not all([unit_number.strip(), destination, gate.strip(), transport_type, status]):
                     st.toast("❌ Mangler felt!", icon="⚠️")
-                elif any(d['unitNumber'] == unit_number for d in st.session_state.departures):
+                elif store.unit_exists(unit_number):
                     st.toast(f"❌ {unit_number} eksisterer!", icon="🚨")
                 else:
-                    st.session_state.departures.append({
+                    new_departure = {
                         "id": generate_id(),
                         "unitNumber": unit_number,
                         "destination": destination,
@@ -283,8 +289,8 @@ with st.sidebar:
                         "type": transport_type,
                         "status": status,
                         "comment": comment or None
-                    })
-                    save_data(st.session_state.departures)
+                    }
+                    store.add(new_departure)
                     st.toast("✅ Registrert!")
                     st.rerun()
 
@@ -298,14 +304,12 @@ if 'confirm_action' in st.session_state:
             action = st.session_state.confirm_action
             if action == "delete":
                 id_to_delete = st.session_state.confirm_id
-                st.session_state.departures = [d for d in st.session_state.departures if d['id'] != id_to_delete]
-                save_data(st.session_state.departures)
+                store.delete(id_to_delete)
                 st.toast("🗑️ Avgang slettet!", icon="✅")
             elif action == "clear_all":
-                st.session_state.departures = []
                 if 'last_uploaded_file' in st.session_state:
                     del st.session_state.last_uploaded_file
-                save_data(st.session_state.departures)
+                store.clear()
                 st.toast("🗑️ Alle avganger slettet!", icon="✅")
 
             for key in ['confirm_action', 'confirm_id', 'confirm_msg']:
@@ -318,19 +322,17 @@ col1, col2 = st.columns(2)
 with col1:
     search_term = st.text_input("Søk på enhetsnummer eller destinasjon").upper()
 with col2:
-    destinations = sorted(set(d['destination'] for d in st.session_state.departures))
+    destinations = table.categories("destination")
     filter_dest = st.selectbox("Filter på destinasjon", ["Alle"] + destinations)
 
 st.markdown('</div>', unsafe_allow_html=True)
 
 # --- Tabellvisning ---
 # Filter departures based on search and destination filter
-filtered_departures = [
-    d for d in st.session_state.departures
-    if (search_term in d['unitNumber'] or search_term in d['destination'])
-    and (filter_dest == "Alle" or d['destination'] == filter_dest)
-]
-df = pd.DataFrame(filtered_departures)
+filtered_ids = table.filter(search_term, None if filter_dest == "Alle" else filter_dest)
+start, stop = page_window(len(filtered_ids), key="departures")
+page = (store.get(i) for i in filtered_ids[start:stop])
+df = pd.DataFrame([d for d in page if d is not None])
 
 if not df.empty:
     for idx, row in df.iterrows():
@@ -360,17 +362,18 @@ else:
 
 # --- Statistikk ---
 st.markdown('<div class="section"><h2>📊 Statistikk</h2>', unsafe_allow_html=True)
-full_df = pd.DataFrame(st.session_state.departures)
+# Tellingene gjøres på kategorikodene i den typede tabellen
+status_counts, type_counts = table.counts("status"), table.counts("type")
 stats = [
-    ("📋", "Totalt", len(full_df), ""),
-    ("✅", "Levert", len(full_df[full_df['status'] == 'Levert']), "status-levert"),
-    ("📦", "Lager", len(full_df[full_df['status'] == 'Lager']), "status-lager"),
-    ("🚚", "Underlasting", len(full_df[full_df['status'] == 'Underlasting']), "status-underlasting"),
-    ("📅", "Planlaget", len(full_df[full_df['status'] == 'Planlaget']), "status-planlaget"),
-    ("🚂", "Tog", len(full_df[full_df['type'] == 'Tog']), "type-tog"),
-    ("🚗", "Bil", len(full_df[full_df['type'] == 'Bil']), "type-bil"),
-    ("🛒", "Tralle", len(full_df[full_df['type'] == 'Tralle']), "type-tralle"),
-    ("📦", "Modul", len(full_df[full_df['type'] == 'Modul']), "type-modul"),
+    ("📋", "Totalt", len(table), ""),
+    ("✅", "Levert", status_counts.get('Levert', 0), "status-levert"),
+    ("📦", "Lager", status_counts.get('Lager', 0), "status-lager"),
+    ("🚚", "Underlasting", status_counts.get('Underlasting', 0), "status-underlasting"),
+    ("📅", "Planlaget", status_counts.get('Planlaget', 0), "status-planlaget"),
+    ("🚂", "Tog", type_counts.get('Tog', 0), "type-tog"),
+    ("🚗", "Bil", type_counts.get('Bil', 0), "type-bil"),
+    ("🛒", "Tralle", type_counts.get('Tralle', 0), "type-tralle"),
+    ("📦", "Modul", type_counts.get('Modul', 0), "type-modul"),
 ]
 st.markdown('<div class="stats-container">', unsafe_allow_html=True)
 for icon, label, value, cls in stats:
@@ -385,6 +388,7 @@ st.markdown('</div></div>', unsafe_allow_html=True)
 
 # --- Systemhandlinger ---
 st.markdown('<div class="section"><h2>⚙️ Handlinger</h2>', unsafe_allow_html=True)
+revision = store.revision
 a, b, c, d = st.columns(4)
 with a:
     if st.button("🗑️ Tøm alt"):
@@ -395,14 +399,18 @@ with b:
     if st.button("🖨️ Skriv ut"):
         st.markdown("<script>window.print();</script>", unsafe_allow_html=True)
 with c:
-    st.download_button("📄 Eksporter CSV", export_to_csv(st.session_state.departures), "avganger.csv", "text/csv")
+    lazy_download_button("📄 Eksporter CSV", lambda: export_to_csv(revision), revision, "avganger.csv", "text/csv",
+                         key="csv_export", prepare_label="⚙️ Lag CSV")
 with d:
-    st.download_button("💾 Eksporter JSON", backup_data(), "backup.json", "application/json")
+    fmt = st.selectbox("Backupformat", list(BACKUP_LABELS), format_func=BACKUP_LABELS.get, key="backup_format")
+    extension, mime = BACKUP_FORMATS[fmt]
+    lazy_download_button("💾 Eksporter JSON", lambda: backup_data(revision, fmt), (revision, fmt), f"backup{extension}",
+                         mime, key="backup_export", prepare_label="⚙️ Lag backup")
 st.markdown('</div>', unsafe_allow_html=True)
 
 # --- Opplasting ---
 st.markdown('<div class="section"><h2>🔼 Last opp data</h2>', unsafe_allow_html=True)
-uploaded = st.file_uploader("Velg JSON-fil", type="json", label_visibility="collapsed")
+uploaded = st.file_uploader("Velg JSON-fil", type=["json", "jsonl", "gz"], label_visibility="collapsed")
 if uploaded:
     file_id = f"{uploaded.name}_{uploaded.size}"
     if st.session_state.last_uploaded_file != file_id:
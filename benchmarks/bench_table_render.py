@@ -0,0 +1,73 @@
+"""Måler tiden for å bygge oversiktstabellen for 100, 1 000 og 10 000 rader.
+
+Kjør fra rotmappen:  python benchmarks/bench_table_render.py
+"""
+import os
+import random
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from table_render import render_departure_table
+
+DESTINATIONS = ["TRONDHEIM", "ÅLESUND", "MOLDE", "FØRDE", "HAUGESUND", "STAVANGER"]
+TYPES = ["Tog", "Bil", "Tralle", "Modul"]
+STATUSES = ["Planlagt", "LASTER NÅ", "LEVERT", "LAGER"]
+
+
+def make_frame(n):
+    rnd = random.Random(n)
+    return pd.DataFrame({
+        "id": range(1, n + 1),
+        "service_date": "2025-01-01",
+        "unit_number": [f"TOG{i:05d}" for i in range(n)],
+        "destination": [rnd.choice(DESTINATIONS) for _ in range(n)],
+        "departure_time": [f"{rnd.randrange(24):02d}:{rnd.randrange(60):02d}" for _ in range(n)],
+        "gate": [f"A{rnd.randrange(20)}" for _ in range(n)],
+        "type": [rnd.choice(TYPES) for _ in range(n)],
+        "status": [rnd.choice(STATUSES) for _ in range(n)],
+        "comment": [rnd.choice([None, "", "FORSINKET"]) for _ in range(n)],
+    })
+
+
+def render_iterrows(df):
+    """Den gamle løsningen fra app.py, til sammenligning."""
+    table_html = "<table><thead><tr><th>Enhetsnummer</th><th>Destinasjon</th><th>Tid</th><th>Gate</th><th>Type</th><th>Status</th><th>Kommentar</th><th>Handlinger</th></tr></thead><tbody>"
+    for _, row in df.iterrows():
+        tc = "#e74c3c" if "Tog" in row["type"] else "#f39c12" if "Bil" in row["type"] else "#3498db" if "Tralle" in row["type"] else "#9b59b6"
+        sc = "#27ae60" if row["status"] == "LEVERT" else "#3498db" if row["status"] == "LAGER" else "#e67e22"
+        table_html += f"""
+        <tr>
+          <td>{row['unit_number']}</td>
+          <td>{row['destination']}</td>
+          <td>{row['departure_time']}</td>
+          <td>{row['gate']}</td>
+          <td><span style='color:{tc};font-weight:bold'>{row['type']}</span></td>
+          <td><span style='color:{sc};font-weight:bold'>{row['status']}</span></td>
+          <td>{row['comment'] or '—'}</td>
+          <td class='action-buttons'>
+            <button class='btn btn-secondary' onclick='edit({row['id']})'>✏️ Rediger</button>
+            <button class='btn btn-danger' onclick='del({row['id']})'>🗑️ Slett</button>
+          </td>
+        </tr>
+        """
+    table_html += "</tbody></table>"
+    return table_html
+
+
+def best_of(func, repeat=5):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+if __name__ == "__main__":
+    print(f"{'rader':>8} {'iterrows (ms)':>15} {'kolonnevis (ms)':>17} {'faktor':>8}")
+    for n in (100, 1_000, 10_000):
+        df = make_frame(n)
+        old = best_of(lambda: render_iterrows(df), repeat=3)
+        new = best_of(lambda: render_departure_table(df, "Rediger", "Slett"))
+        print(f"{n:>8} {old * 1000:>15.2f} {new * 1000:>17.2f} {old / new:>7.1f}x")
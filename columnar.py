@@ -0,0 +1,132 @@
+import threading
+
+import pandas as pd
+
+# =======================
+# Kolonnevis tilleggsbuffer
+# =======================
+# En registrering legger én verdi til hver kolonne-liste (amortisert O(1)),
+# i stedet for å bygge en ny DataFrame med pd.concat. DataFrame lages først
+# når tabellen skal vises, og gjenbrukes til antallet rader endrer seg.
+
+
+class ColumnBuffer:
+    """Rader lagret som én Python-liste per kolonne.
+
+    `revision` er lagerets revisjon bufferen sist ble synket mot (None før
+    første synk); se `DepartureStore.revision`.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self.reset([])
+
+    def reset(self, records, revision=None):
+        with self._lock:
+            self._data = {col: [r.get(col) for r in records] for col in self.columns}
+            self._length = len(records)
+            self._frame = None
+            self.revision = revision
+
+    def __len__(self):
+        return self._length
+
+    def append(self, record, revision=None):
+        """Legger til én rad.
+
+        Med `revision` legges raden bare til hvis bufferen var à jour rett
+        før endringen; ellers blir den stående utdatert og må lastes på nytt.
+        """
+        with self._lock:
+            if revision is not None:
+                if self.revision != revision - 1:
+                    return False
+                self.revision = revision
+            for col in self.columns:
+                self._data[col].append(record.get(col))
+            self._length += 1
+            return True
+
+    def to_frame(self):
+        with self._lock:
+            if self._frame is None or len(self._frame) != self._length:
+                self._frame = pd.DataFrame(self._data, columns=self.columns)
+            return self._frame
+
+
+# =======================
+# Typet tabell for avganger
+# =======================
+# Destinasjon, type og status har bare en håndfull verdier hver og lagres som
+# kategorier (én liten heltallskode per rad), og avgangstid som minutter
+# etter midnatt. Filtre og tellinger blir dermed vektoriserte
+# heltallsoperasjoner i stedet for strengsammenligninger per post.
+CATEGORY_COLUMNS = ["destination", "type", "status"]
+
+# Feltnavnene i JSON-appene (app04.py, Streamlit.py, streamlit_app2.py)
+JSON_FIELDS = {
+    "id": "id", "unit_number": "unitNumber", "destination": "destination",
+    "departure_time": "time", "type": "type", "status": "status",
+}
+
+
+def time_to_minutes(values):
+    """'HH:MM' -> minutter etter midnatt (int16); -1 for ugyldige verdier."""
+    text = pd.Series(values, dtype="string")
+    hours = pd.to_numeric(text.str.slice(0, 2), errors="coerce")
+    minutes = pd.to_numeric(text.str.slice(3, 5), errors="coerce")
+    return (hours * 60 + minutes).fillna(-1).astype("int16").to_numpy()
+
+
+def minutes_to_time(minutes):
+    return [f"{m // 60:02d}:{m % 60:02d}" if m >= 0 else "" for m in minutes.tolist()]
+
+
+def categorize(df):
+    """Gjør destinasjon, type og status om til kategorier der de finnes."""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+class DepartureTable:
+    """Kolonnevis, typet kopi av avgangene for søk, filter og statistikk.
+
+    Tabellen holder bare feltene som filtreres og telles på; selve postene
+    hentes fra lageret med id-ene som `filter` returnerer.
+    """
+
+    def __init__(self, records, fields=JSON_FIELDS):
+        columns = {name: [r.get(key) for r in records] for name, key in fields.items()}
+        self.frame = categorize(pd.DataFrame({
+            "id": pd.Series(columns["id"], dtype="int64"),
+            "unit_number": pd.Series(columns["unit_number"], dtype="string").fillna(""),
+            "destination": columns["destination"],
+            "type": columns["type"],
+            "status": columns["status"],
+            "minutes": time_to_minutes(columns["departure_time"]),
+        }))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def filter(self, search="", destination=None):
+        """Id-ene som matcher søk (enhetsnummer/destinasjon) og destinasjon."""
+        frame = self.frame
+        mask = pd.Series(True, index=frame.index)
+        if search:
+            # Søket i destinasjon gjøres på kategoriene (noen få), ikke radene
+            dest = frame["destination"].cat
+            hits = dest.categories[dest.categories.astype(str).str.contains(search, regex=False)]
+            mask &= frame["unit_number"].str.contains(search, regex=False) | frame["destination"].isin(hits)
+        if destination is not None:
+            mask &= frame["destination"] == destination
+        return frame["id"][mask].tolist()
+
+    def counts(self, column):
+        return {str(k): int(v) for k, v in self.frame[column].value_counts().items()}
+
+    def categories(self, column):
+        return sorted(self.frame[column].cat.categories.astype(str))
@@ -0,0 +1,509 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+# =======================
+# Database: delt tilkoblingspool (WAL)
+# =======================
+DB_PATH = "data.db"
+
+# Pragmas som settes på hver tilkobling. WAL lar lesere jobbe parallelt med
+# én skriver, og synchronous=NORMAL er trygt i WAL-modus.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",      # ca. 16 MB sidecache
+    "PRAGMA mmap_size=268435456",    # 256 MB minnemappet lesing
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class ConnectionPool:
+    """Én lesetilkobling per tråd og én felles skriver bak en lås.
+
+    Streamlit starter en ny tråd for hver kjøring, så lesetilkoblingen legges
+    tilbake i `_idle` når tråden er ferdig og gjenbrukes av neste tråd.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._idle = []
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+
+    def _connect(self):
+        # isolation_level=None: vi styrer transaksjoner selv, og lesere holder
+        # dermed aldri en åpen transaksjon mellom to spørringer.
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = self._idle.pop()
+            except IndexError:
+                conn = self._connect()
+            self._local.conn = conn
+            weakref.finalize(threading.current_thread(), self._idle.append, conn)
+        return conn
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+
+# =======================
+# Skjema og migreringer
+# =======================
+# Hver migrering er en liste med SQL-setninger. PRAGMA user_version holder
+# styr på hvor langt databasen er kommet, så hver migrering kjøres én gang.
+DEPARTURE_KEY_COLUMNS = ["service_date", "unit_number", "destination", "departure_time"]
+DEPARTURE_KEY = ", ".join(DEPARTURE_KEY_COLUMNS)
+# Alle kolonner unntatt id; to rader er bare like hvis alle disse er like
+DEPARTURE_COLUMNS = ", ".join(DEPARTURE_KEY_COLUMNS + ["gate", "type", "status", "comment", "created_at"])
+
+
+def _same_values(a, b):
+    return " AND ".join(f"{a}.{col} IS {b}.{col}" for col in DEPARTURE_COLUMNS.split(", "))
+
+
+def _day_revision_trigger(event, *rows):
+    bumps = "".join(
+        f"""
+            INSERT INTO day_revisions (service_date, value) VALUES ({row}.service_date, 1)
+            ON CONFLICT (service_date) DO UPDATE SET value = value + 1;"""
+        for row in rows
+    )
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_departures_{event.lower()}_day_revision
+        AFTER {event} ON departures
+        BEGIN{bumps}
+        END
+        """
+
+
+def _change_trigger(event, op, row):
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_departures_{event.lower()}_change
+        AFTER {event} ON departures
+        BEGIN
+            INSERT INTO departure_changes (departure_id, op, service_date) VALUES ({row}.id, '{op}', {row}.service_date);
+        END
+        """
+
+
+FTS_COLUMNS = "unit_number, gate, destination, comment"
+
+
+def _fts_values(row):
+    return ", ".join(f"{row}.{col}" for col in FTS_COLUMNS.split(", "))
+
+
+MIGRATIONS = [
+    # 1: grunntabellen
+    [
+        """
+        CREATE TABLE IF NOT EXISTS departures (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_date TEXT NOT NULL,
+            unit_number TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            departure_time TEXT NOT NULL,
+            gate TEXT NOT NULL,
+            type TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'Planlagt',
+            comment TEXT,
+            created_at TEXT NOT NULL
+        )
+        """,
+    ],
+    # 2: indekser for dagsvisning og unik nøkkel for duplikatsjekk.
+    # Eksakte kopier (like i alle kolonner) slettes. Rader som deler nøkkel,
+    # men har ulik luke, type, status e.l., flyttes til departures_conflicts
+    # (med id-en til raden som ble beholdt), så ingen redigering går tapt.
+    [
+        f"""
+        DELETE FROM departures WHERE EXISTS (
+            SELECT 1 FROM departures AS d
+            WHERE d.id < departures.id AND {_same_values("d", "departures")}
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS departures_conflicts (
+            id INTEGER PRIMARY KEY,
+            service_date TEXT NOT NULL,
+            unit_number TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            departure_time TEXT NOT NULL,
+            gate TEXT NOT NULL,
+            type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            comment TEXT,
+            created_at TEXT NOT NULL,
+            kept_id INTEGER NOT NULL
+        )
+        """,
+        f"""
+        INSERT INTO departures_conflicts (id, {DEPARTURE_COLUMNS}, kept_id)
+        SELECT d.id, {", ".join("d." + col for col in DEPARTURE_COLUMNS.split(", "))}, k.kept_id
+        FROM departures AS d
+        JOIN (SELECT MIN(id) AS kept_id, {DEPARTURE_KEY} FROM departures GROUP BY {DEPARTURE_KEY}) AS k
+        USING ({DEPARTURE_KEY})
+        WHERE d.id <> k.kept_id
+        """,
+        "DELETE FROM departures WHERE id IN (SELECT id FROM departures_conflicts)",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_departures_key ON departures ({DEPARTURE_KEY})",
+        "CREATE INDEX IF NOT EXISTS ix_departures_day_time ON departures (service_date, departure_time)",
+        "CREATE INDEX IF NOT EXISTS ix_departures_day_dest ON departures (service_date, destination, departure_time)",
+    ],
+    # 3: revisjonsteller som økes ved hver endring, for billig endringssjekk
+    [
+        """
+        CREATE TABLE IF NOT EXISTS data_revision (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO data_revision (id, value) VALUES (1, 0)",
+        *(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_departures_{event.lower()}_revision
+            AFTER {event} ON departures
+            BEGIN
+                UPDATE data_revision SET value = value + 1 WHERE id = 1;
+            END
+            """
+            for event in ("INSERT", "UPDATE", "DELETE")
+        ),
+    ],
+    # 4: revisjon per driftsdøgn, så en endring bare ugyldiggjør sin egen dag
+    [
+        """
+        CREATE TABLE IF NOT EXISTS day_revisions (
+            service_date TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        _day_revision_trigger("INSERT", "NEW"),
+        _day_revision_trigger("UPDATE", "OLD", "NEW"),
+        _day_revision_trigger("DELETE", "OLD"),
+    ],
+    # 5: fulltekstindeks (FTS5) over enhet, luke, destinasjon og kommentar
+    [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS departures_fts USING fts5(
+            {FTS_COLUMNS},
+            content='departures', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        "INSERT INTO departures_fts (departures_fts) VALUES ('rebuild')",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_departures_insert_fts AFTER INSERT ON departures
+        BEGIN
+            INSERT INTO departures_fts (rowid, {FTS_COLUMNS}) VALUES (NEW.id, {_fts_values("NEW")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_departures_delete_fts AFTER DELETE ON departures
+        BEGIN
+            INSERT INTO departures_fts (departures_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', OLD.id, {_fts_values("OLD")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_departures_update_fts AFTER UPDATE ON departures
+        BEGIN
+            INSERT INTO departures_fts (departures_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', OLD.id, {_fts_values("OLD")});
+            INSERT INTO departures_fts (rowid, {FTS_COLUMNS}) VALUES (NEW.id, {_fts_values("NEW")});
+        END
+        """,
+    ],
+    # 6: endringslogg for delta-synk (se changes_since), fylt med dagens rader
+    [
+        """
+        CREATE TABLE IF NOT EXISTS departure_changes (
+            rev INTEGER PRIMARY KEY AUTOINCREMENT,
+            departure_id INTEGER NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('upsert', 'delete')),
+            service_date TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_departure_changes_departure ON departure_changes (departure_id, rev)",
+        """
+        CREATE TABLE IF NOT EXISTS change_log_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            compacted_through INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO change_log_state (id, compacted_through) VALUES (1, 0)",
+        """
+        INSERT INTO departure_changes (departure_id, op, service_date)
+        SELECT id, 'upsert', service_date FROM departures ORDER BY id
+        """,
+        _change_trigger("INSERT", "upsert", "NEW"),
+        _change_trigger("UPDATE", "upsert", "NEW"),
+        _change_trigger("DELETE", "delete", "OLD"),
+    ],
+    # 7: full synk av én driftsdag (changes_since med day) uten å lese hele loggen
+    [
+        "CREATE INDEX IF NOT EXISTS ix_changes_day ON departure_changes (service_date, rev)",
+    ],
+]
+
+
+def migrate(pool):
+    with pool.writer() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {number}")
+
+
+# =======================
+# Sortering og keyset-paginering
+# =======================
+# Hver sortering ender på id, så rekkefølgen er entydig og siste rad på en
+# side kan brukes som markør for neste side: WHERE (kolonner) > (markør).
+SORT_COLUMNS = {
+    "time": ["departure_time", "id"],
+    "dest": ["destination", "departure_time", "id"],
+}
+
+
+def order_by(sort_key, alias=""):
+    return ", ".join(alias + col for col in SORT_COLUMNS[sort_key])
+
+
+def keyset_condition(sort_key, alias=""):
+    placeholders = ", ".join("?" * len(SORT_COLUMNS[sort_key]))
+    return f"({order_by(sort_key, alias)}) > ({placeholders})"
+
+
+def departures_query(day, dest_filter="", sort_key="time", after=None, limit=None):
+    """SQL og parametre for én side av dagens avganger (keyset etter `after`)."""
+    where = "service_date = ?"
+    args = [day]
+    if dest_filter:
+        where += " AND destination = ?"
+        args.append(dest_filter)
+    if after is not None:
+        where += " AND " + keyset_condition(sort_key)
+        args.extend(after)
+    query = f"SELECT * FROM departures WHERE {where} ORDER BY {order_by(sort_key)} LIMIT ?"
+    args.append(limit or -1)
+    return query, args
+
+
+def data_revision(pool):
+    """Gjeldende revisjon; endres hver gang en avgang legges til, endres eller slettes."""
+    return pool.reader().execute("SELECT value FROM data_revision WHERE id = 1").fetchone()[0]
+
+
+def day_revision(pool, day):
+    """Revisjonen for ett driftsdøgn; 0 hvis dagen aldri har hatt avganger."""
+    row = pool.reader().execute("SELECT value FROM day_revisions WHERE service_date = ?", (day,)).fetchone()
+    return row[0] if row else 0
+
+
+def range_revision(pool, start_day, end_day):
+    """Revisjon for en periode. Dagsrevisjonene bare øker, så summen endres
+    ved enhver endring i perioden og kan brukes som cache-nøkkel."""
+    return pool.reader().execute(
+        "SELECT COALESCE(SUM(value), 0) FROM day_revisions WHERE service_date BETWEEN ? AND ?",
+        (start_day, end_day),
+    ).fetchone()[0]
+
+
+# =======================
+# Endringslogg (delta-synk)
+# =======================
+# Hver innsetting, endring og sletting får et stigende revisjonsnummer i
+# departure_changes. En klient husker siste revisjon den har sett og henter
+# bare endringene etter den; slettinger kommer som gravsteiner ("delete").
+#
+# Kompaktering fjerner oppføringer som er erstattet av en nyere for samme
+# avgang (de vises aldri uansett), og gravsteiner eldre enn
+# TOMBSTONE_RETENTION revisjoner. En klient som ligger bak den grensen kan
+# ha gått glipp av slettinger og får reset=True: den må tømme sin kopi og
+# starte på nytt fra revisjon 0.
+CHANGES_PAGE_SIZE = 1000
+TOMBSTONE_RETENTION = 10000
+
+
+def change_revision(pool):
+    row = pool.reader().execute("SELECT MAX(rev) FROM departure_changes").fetchone()
+    return row[0] or 0
+
+
+def scope_change(change, day):
+    """Endringen slik en klient som bare følger driftsdagen `day` skal se den.
+
+    En avgang som er flyttet til en annen dag, blir en sletting for denne
+    dagen. Returnerer None for endringer som ikke angår dagen.
+    """
+    if day is None:
+        return change
+    if change["op"] == "upsert":
+        service_date = change["departure"]["service_date"]
+        if service_date == day:
+            return change
+        return {"rev": change["rev"], "id": change["id"], "op": "delete", "service_date": service_date}
+    return change if change["service_date"] == day else None
+
+
+def changes_since(pool, since=0, limit=CHANGES_PAGE_SIZE, day=None):
+    """Endringene etter revisjon `since`, siste endring per avgang.
+
+    Returnerer {"revision", "changes", "has_more", "reset"}. `revision` er
+    revisjonen klienten skal sende som `since` neste gang. Med `day` gjelder
+    endringene bare den driftsdagen (se scope_change); fra since=0 er det
+    bare dagens avganger.
+    """
+    conn = pool.reader()
+    # Én lesetransaksjon, så grensen og endringene er fra samme øyeblikk
+    conn.execute("BEGIN")
+    try:
+        compacted_through = conn.execute("SELECT compacted_through FROM change_log_state WHERE id = 1").fetchone()[0]
+        current = change_revision(pool)
+        if 0 < since < compacted_through:
+            return {"revision": current, "changes": [], "has_more": False, "reset": True}
+        where, args = "", [since]
+        if day is not None and since == 0:
+            # Full synk av én dag: en ny klient trenger ingen slettinger
+            where, args = "AND c.service_date = ? AND c.op = 'upsert'", [since, day]
+        cur = conn.execute(f"""
+            SELECT c.rev, c.departure_id, c.op, c.service_date, d.*
+            FROM departure_changes c
+            LEFT JOIN departures d ON d.id = c.departure_id AND c.op = 'upsert'
+            WHERE c.rev > ? {where}
+              AND c.rev = (SELECT MAX(rev) FROM departure_changes WHERE departure_id = c.departure_id)
+            ORDER BY c.rev
+            LIMIT ?
+        """, (*args, limit + 1))
+        columns = [col[0] for col in cur.description][4:]
+        rows = cur.fetchall()
+    finally:
+        conn.execute("COMMIT")
+    changes = []
+    for rev, departure_id, op, service_date, *values in rows[:limit]:
+        change = {"rev": rev, "id": departure_id, "op": op}
+        if op == "upsert":
+            change["departure"] = dict(zip(columns, values))
+        else:
+            change["service_date"] = service_date
+        changes.append(change)
+    has_more = len(rows) > limit
+    revision = changes[-1]["rev"] if has_more else max(since, current)
+    if day is not None:
+        changes = [c for c in (scope_change(c, day) for c in changes) if c is not None]
+    return {"revision": revision, "changes": changes, "has_more": has_more, "reset": False}
+
+
+def compact_changes(pool, tombstone_retention=TOMBSTONE_RETENTION):
+    """Rydder i endringsloggen. Returnerer antall fjernede oppføringer."""
+    with pool.writer() as conn:
+        removed = conn.execute("""
+            DELETE FROM departure_changes WHERE rev < (
+                SELECT MAX(rev) FROM departure_changes c WHERE c.departure_id = departure_changes.departure_id
+            )
+        """).rowcount
+        horizon = (conn.execute("SELECT MAX(rev) FROM departure_changes").fetchone()[0] or 0) - tombstone_retention
+        if horizon > 0:
+            removed += conn.execute(
+                "DELETE FROM departure_changes WHERE op = 'delete' AND rev <= ?", (horizon,)
+            ).rowcount
+            conn.execute(
+                "UPDATE change_log_state SET compacted_through = MAX(compacted_through, ?) WHERE id = 1", (horizon,)
+            )
+    return removed
+
+
+# =======================
+# CRUD
+# =======================
+# Delt av Streamlit-appen (app.py) og API-et (api.py).
+DEPARTURE_COLUMNS = DEPARTURE_KEY_COLUMNS + ["gate", "type", "status", "comment"]
+
+
+def _departure_values(data):
+    defaults = {"status": "Planlagt", "comment": ""}
+    return [data.get(col, defaults.get(col)) for col in DEPARTURE_COLUMNS]
+
+
+def add_departure(pool, data):
+    """Setter inn én avgang. Returnerer (ny id, None) eller (None, "duplicate")."""
+    with pool.writer() as conn:
+        cur = conn.execute(f"""
+            INSERT INTO departures ({", ".join(DEPARTURE_COLUMNS)}, created_at)
+            VALUES ({", ".join("?" * len(DEPARTURE_COLUMNS))}, ?)
+            ON CONFLICT ({DEPARTURE_KEY}) DO NOTHING
+        """, (*_departure_values(data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    if cur.rowcount == 0:
+        return None, "duplicate"
+    return cur.lastrowid, None
+
+
+def update_departure(pool, row_id, data):
+    """Returnerer (True, None), (False, "duplicate") eller (False, "not_found")."""
+    assignments = ", ".join(f"{col}=?" for col in DEPARTURE_COLUMNS)
+    try:
+        with pool.writer() as conn:
+            cur = conn.execute(f"UPDATE departures SET {assignments} WHERE id=?", (*_departure_values(data), row_id))
+    except sqlite3.IntegrityError:
+        return False, "duplicate"
+    if cur.rowcount == 0:
+        return False, "not_found"
+    return True, None
+
+
+def get_departure(pool, row_id):
+    cur = pool.reader().execute("SELECT * FROM departures WHERE id = ?", (row_id,))
+    row = cur.fetchone()
+    return dict(zip((col[0] for col in cur.description), row)) if row else None
+
+
+def delete_departure(pool, row_id):
+    """Returnerer True hvis avgangen fantes."""
+    with pool.writer() as conn:
+        cur = conn.execute("DELETE FROM departures WHERE id = ?", (row_id,))
+    return cur.rowcount > 0
+
+
+def clear_all_departures(pool, day=None):
+    """Sletter alle avganger, eller bare avgangene på driftsdagen `day`."""
+    with pool.writer() as conn:
+        if day is None:
+            conn.execute("DELETE FROM departures")
+        else:
+            conn.execute("DELETE FROM departures WHERE service_date = ?", (day,))
+
+
+try:
+    import streamlit as st
+    _cache_resource = st.cache_resource
+except ImportError:
+    from functools import lru_cache
+    _cache_resource = lru_cache(maxsize=None)
+
+
+@_cache_resource
+def get_pool(path=DB_PATH):
+    pool = ConnectionPool(path)
+    migrate(pool)
+    return pool
@@ -0,0 +1,252 @@
+import threading
+
+from ids import generate_id
+from jsonl_store import JsonlStore, int_id
+
+# =======================
+# Felles avgangsliste for alle økter
+# =======================
+# Én liste per prosess i stedet for én kopi per nettleserøkt. Alle endringer
+# går gjennom lageret, som oppdaterer listen og indeksene under én lås, så en
+# registrering i én økt er synlig i alle andre ved neste kjøring.
+# Deler flere apper samme fil (Streamlit.py og streamlit_app2.py), hentes
+# deres nye logglinjer inn før hver lesing og endring; se `refresh`.
+
+
+class DepartureRepository:
+    """Avganger indeksert på id og enhetsnummer.
+
+    Oppslag, duplikatsjekk og sletting er dict-operasjoner i stedet for et
+    søk gjennom hele listen. Repository-et eier ingen filer og ingen lås;
+    det gjør `DepartureStore`.
+    """
+
+    def __init__(self, records=()):
+        self._by_id = {}    # id -> post, i innsettingsrekkefølge
+        self._by_unit = {}  # enhetsnummer -> id-er (importerte filer kan ha like)
+        for record in records:
+            self.put(record)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, record_id):
+        return record_id in self._by_id
+
+    def all(self):
+        return list(self._by_id.values())
+
+    def get(self, record_id):
+        return self._by_id.get(record_id)
+
+    def unit_exists(self, unit_number, exclude_id=None):
+        ids = self._by_unit.get(unit_number, ())
+        return any(i != exclude_id for i in ids)
+
+    def put(self, record):
+        """Legger til eller erstatter posten med samme id."""
+        old = self._by_id.get(record["id"])
+        if old is not None:
+            self._unindex_unit(old)
+        self._by_id[record["id"]] = record
+        self._by_unit.setdefault(record.get("unitNumber"), set()).add(record["id"])
+
+    def remove(self, record_id):
+        record = self._by_id.pop(record_id, None)
+        if record is not None:
+            self._unindex_unit(record)
+        return record
+
+    def clear(self):
+        self._by_id.clear()
+        self._by_unit.clear()
+
+    def _unindex_unit(self, record):
+        unit = record.get("unitNumber")
+        ids = self._by_unit.get(unit)
+        if ids:
+            ids.discard(record["id"])
+            if not ids:
+                del self._by_unit[unit]
+
+
+class DepartureStore:
+    """Felles, trådsikkert lager: et `DepartureRepository` pluss lagring.
+
+    Postene som returneres er delte mellom øktene og skal ikke endres
+    direkte; bruk `update`.
+    """
+
+    def __init__(self, storage, normalize=None):
+        self.storage = storage
+        self.normalize = normalize
+        self._lock = threading.RLock()
+        self._revision = 0
+        self._repo = DepartureRepository(self._normalized(storage.load()))
+
+    @property
+    def revision(self):
+        """Øker for hver endring, også endringer lest inn fra andre prosesser."""
+        with self._lock:
+            self.refresh()
+            return self._revision
+
+    def refresh(self):
+        """Tar inn det andre prosesser har skrevet til filene siden sist."""
+        with self._lock:
+            changes = self.storage.read_changes()
+            if changes is None:
+                return
+            kind, data = changes
+            if kind == "snapshot":
+                self._repo = DepartureRepository(self._normalized(data))
+            else:
+                for entry in data:
+                    self._replay(entry)
+            self._revision += 1
+
+    def _replay(self, entry):
+        op = entry.get("op")
+        if op == "put":
+            self._repo.put(*self._normalized([entry["record"]]))
+        elif op == "delete":
+            self._repo.remove(entry["id"])
+        elif op == "clear":
+            self._repo.clear()
+
+    def _normalized(self, records):
+        if self.normalize:
+            for record in records:
+                self.normalize(record)
+        return records
+
+    # --- Lesing ---
+    def all(self):
+        with self._lock:
+            self.refresh()
+            return self._repo.all()
+
+    def __len__(self):
+        with self._lock:
+            self.refresh()
+            return len(self._repo)
+
+    def get(self, record_id):
+        return self._repo.get(record_id)
+
+    def unit_exists(self, unit_number, exclude_id=None):
+        with self._lock:
+            self.refresh()
+            return self._repo.unit_exists(unit_number, exclude_id)
+
+    # --- Endringer ---
+    # Endringen legges inn i listen og linjen legges i kø under låsen, så
+    # loggen får endringene i samme rekkefølge som minnet. Skrivingen (og
+    # fsync) skjer etter at låsen er sluppet, så klikk fra flere økter havner
+    # i samme flush. Feiler skrivingen, settes posten tilbake; se `_commit`.
+    def add(self, record):
+        """Legger til én post. Returnerer den nye revisjonen."""
+        with self._lock:
+            self.refresh()
+            self._normalized([record])
+            self._repo.put(record)
+            self._revision += 1
+            revision = self._revision
+            ticket = self.storage.put(record, wait=False)
+        self._commit(ticket, [(record["id"], record, None)])
+        return revision
+
+    def update(self, record_id, changes):
+        with self._lock:
+            self.refresh()
+            old = self._repo.get(record_id)
+            if old is None:
+                return None
+            record = {**old, **changes, "id": record_id}
+            self._normalized([record])
+            self._repo.put(record)
+            self._revision += 1
+            ticket = self.storage.put(record, wait=False)
+        self._commit(ticket, [(record_id, record, old)])
+        return record
+
+    def delete(self, record_id):
+        with self._lock:
+            self.refresh()
+            old = self._repo.remove(record_id)
+            if old is None:
+                return False
+            self._revision += 1
+            ticket = self.storage.delete(record_id, wait=False)
+        self._commit(ticket, [(record_id, None, old)])
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.storage.clear()
+            self._repo.clear()
+            self._revision += 1
+
+    def merge(self, records):
+        """Legger til postene med id som ikke finnes fra før. Returnerer antall nye."""
+        with self._lock:
+            self.refresh()
+            added = []
+            for record in self._normalized(records):
+                if record.get("id") is None:
+                    continue
+                # Samme heltalls-id som ved lasting (se jsonl_store._index_by_id)
+                record_id = int_id(record["id"])
+                record["id"] = record_id if record_id is not None else generate_id()
+                if record["id"] not in self._repo:
+                    self._repo.put(record)
+                    added.append(record)
+            if not added:
+                return 0
+            self._revision += 1
+            ticket = self.storage.put_many(added, wait=False)
+        self._commit(ticket, [(record["id"], record, None) for record in added])
+        return len(added)
+
+    def replace(self, records):
+        """Erstatter hele listen, f.eks. ved opplasting av backup."""
+        with self._lock:
+            self._normalized(records)
+            # Lagringen gir nye id-er til poster som mangler eller deler id
+            self.storage.replace(records)
+            self._repo = DepartureRepository(records)
+            self._revision += 1
+
+    def _commit(self, ticket, undo):
+        """Venter på skrivingen. Feiler den, rulles endringene i minnet tilbake.
+
+        `undo` er (id, ny post eller None, gammel post eller None) per post.
+        En post som en annen tråd har endret i mellomtiden, røres ikke.
+        """
+        try:
+            self.storage.wait(ticket)
+        except BaseException:
+            with self._lock:
+                for record_id, new, old in undo:
+                    if self._repo.get(record_id) is not new:
+                        continue
+                    if old is None:
+                        self._repo.remove(record_id)
+                    else:
+                        self._repo.put(old)
+                self._revision += 1
+            raise
+
+
+try:
+    import streamlit as st
+    _cache_resource = st.cache_resource
+except ImportError:
+    from functools import lru_cache
+    _cache_resource = lru_cache(maxsize=None)
+
+
+@_cache_resource
+def get_departure_store(snapshot_path, _on_compact=None, _normalize=None):
+    """Ett felles lager per fil i prosessen, delt av alle økter."""
+    return DepartureStore(JsonlStore(snapshot_path, on_compact=_on_compact), _normalize)
@@ -0,0 +1,152 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+import streamlit as st
+
+# =======================
+# Eksport og backup
+# =======================
+# Filene bygges først når noen ber om dem, og radene skrives i porsjoner:
+# fra SQLite hentes de med fetchmany, så hele utvalget aldri ligger i
+# minnet som DataFrame.
+CHUNK_ROWS = 5000
+
+# Backup-formater: navn -> (filendelse, MIME-type)
+BACKUP_FORMATS = {
+    "json": (".json", "application/json"),
+    "compact": (".json", "application/json"),
+    "gzip": (".json.gz", "application/gzip"),
+    "sqlite": (".db", "application/vnd.sqlite3"),
+}
+
+
+def _csv_chunks(header, rows, chunk_rows=CHUNK_ROWS):
+    """Skriver header og rader som CSV og gir teksten tilbake i porsjoner."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(header)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % chunk_rows == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def iter_departures_csv(pool, start_day, end_day, dest_filter="", chunk_rows=CHUNK_ROWS):
+    """CSV for alle avganger fra og med `start_day` til og med `end_day`."""
+    where = "service_date BETWEEN ? AND ?"
+    args = [start_day, end_day]
+    if dest_filter:
+        where += " AND destination = ?"
+        args.append(dest_filter)
+    cur = pool.reader().execute(
+        f"SELECT * FROM departures WHERE {where} ORDER BY service_date, departure_time, id", args
+    )
+    header = [col[0] for col in cur.description]
+
+    def rows():
+        while batch := cur.fetchmany(chunk_rows):
+            yield from batch
+
+    return _csv_chunks(header, rows(), chunk_rows)
+
+
+def iter_records_csv(records, columns, chunk_rows=CHUNK_ROWS):
+    """CSV for en liste med dict-poster (JSON-appene)."""
+    rows = ([r.get(col) for col in columns] for r in records)
+    return _csv_chunks(columns, rows, chunk_rows)
+
+
+def _json_chunks(records, compact=False, chunk_rows=CHUNK_ROWS):
+    """Skriver postene som én JSON-liste. Lesbar form har samme innrykk som før."""
+    if compact:
+        dump = lambda r: json.dumps(r, ensure_ascii=False, separators=(",", ":"))
+        start, sep, end = "[", ",", "]"
+    else:
+        dump = lambda r: "  " + json.dumps(r, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        start, sep, end = "[\n", ",\n", "\n]"
+    parts = [start]
+    count = 0
+    for count, record in enumerate(records, start=1):
+        if count > 1:
+            parts.append(sep)
+        parts.append(dump(record))
+        if count % chunk_rows == 0:
+            yield "".join(parts)
+            parts = []
+    parts.append(end if count else "]")
+    yield "".join(parts)
+
+
+def iter_departures_json(pool, start_day, end_day, dest_filter="", compact=False, chunk_rows=CHUNK_ROWS):
+    """JSON-liste for avgangene i perioden, lest med fetchmany som CSV-en."""
+    where = "service_date BETWEEN ? AND ?"
+    args = [start_day, end_day]
+    if dest_filter:
+        where += " AND destination = ?"
+        args.append(dest_filter)
+    cur = pool.reader().execute(
+        f"SELECT * FROM departures WHERE {where} ORDER BY service_date, departure_time, id", args
+    )
+    columns = [col[0] for col in cur.description]
+
+    def records():
+        while batch := cur.fetchmany(chunk_rows):
+            for row in batch:
+                yield dict(zip(columns, row))
+
+    return _json_chunks(records(), compact, chunk_rows)
+
+
+def iter_records_json(records, compact=False, chunk_rows=CHUNK_ROWS):
+    return _json_chunks(records, compact, chunk_rows)
+
+
+def encode_chunks(chunks, compress=False):
+    if not compress:
+        return b"".join(chunk.encode("utf-8") for chunk in chunks)
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as f:
+        for chunk in chunks:
+            f.write(chunk.encode("utf-8"))
+    return buf.getvalue()
+
+
+def database_backup(pool):
+    """Hele databasen som én fil, tatt med SQLites online backup-API.
+
+    Kopien er konsistent selv om andre skriver samtidig, og går side for
+    side uten å gå via pandas.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "backup.db")
+        target = sqlite3.connect(path)
+        try:
+            pool.reader().backup(target)
+        finally:
+            target.close()
+        with open(path, "rb") as f:
+            data = f.read()
+    return data
+
+
+def lazy_download_button(label, build, token, file_name, mime, key, prepare_label):
+    """Nedlastingsknapp som bygger filen først når brukeren ber om den.
+
+    Første klikk (på `prepare_label`) lagrer `token` i session_state, og så
+    vises selve nedlastingen. Når `token` endres (ny revisjon eller nytt
+    utvalg), må filen bestilles på nytt; `build` bør være cachet på det
+    samme.
+    """
+    if st.session_state.get(key) != token:
+        if not st.button(prepare_label, key=f"{key}_prepare", use_container_width=True):
+            return
+        st.session_state[key] = token
+    st.download_button(label, build(), file_name, mime, key=f"{key}_download", use_container_width=True)
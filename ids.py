@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+
+from jsonl_store import hold_lock
+
+# =======================
+# Tidsordnede id-er
+# =======================
+# id = millisekunder siden EPOCH | prosess | løpenummer innenfor samme ms.
+# Id-ene er stigende, unike selv ved mange registreringer i samme sekund, og
+# holder seg under 2**53 så de kan brukes som tall i JavaScript/JSON.
+#
+# Prosessnummeret (worker) reserveres med en låsfil per nummer i
+# arbeidsmappen, der appene også har datafilene sine. Hver prosess som
+# lager id-er får dermed sitt eget nummer, og to prosesser kan ikke lage
+# samme id. Låsen slippes når prosessen avslutter.
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00 UTC
+WORKER_BITS = 5
+SEQUENCE_BITS = 7
+
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class IdGenerator:
+    """Lager id-er for én prosess; `worker` skiller prosesser fra hverandre."""
+
+    def __init__(self, worker):
+        self.worker = worker & MAX_WORKER
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            now = int(time.time() * 1000) - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            elif self._sequence < MAX_SEQUENCE:
+                # Samme ms, eller klokken har gått bakover: fortsett fra forrige
+                self._sequence += 1
+            else:
+                # Løpenumrene for dette millisekundet er brukt opp; lån neste
+                self._last_ms, self._sequence = self._last_ms + 1, 0
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker << SEQUENCE_BITS) | self._sequence
+
+
+WORKER_LOCK = ".ids-worker-{}.lock"
+
+_generator = None
+_worker_lock = None  # holdes åpen så lenge prosessen lever
+_init_lock = threading.Lock()
+
+
+def reserve_worker(directory="."):
+    """Reserverer et ledig worker-nummer. Returnerer (nummer, åpen låsfil)."""
+    for worker in range(MAX_WORKER + 1):
+        f = hold_lock(os.path.join(directory, WORKER_LOCK.format(worker)))
+        if f is not None:
+            return worker, f
+    raise RuntimeError(f"Alle {MAX_WORKER + 1} worker-numre for id-er er i bruk")
+
+
+def generate_id():
+    global _generator, _worker_lock
+    if _generator is None:
+        with _init_lock:
+            if _generator is None:
+                worker, _worker_lock = reserve_worker()
+                _generator = IdGenerator(worker)
+    return _generator.next_id()
@@ -0,0 +1,96 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+from db import DEPARTURE_KEY, DEPARTURE_KEY_COLUMNS
+from jsonstream import batched, iter_json_records
+
+# =======================
+# Bulk-import av avganger
+# =======================
+BATCH_SIZE = 1000
+
+REQUIRED_COLUMNS = ["service_date", "unit_number", "destination", "departure_time", "gate", "type"]
+COLUMNS = REQUIRED_COLUMNS + ["status", "comment"]
+
+# Backuper fra nettsiden (transportsystem/) bruker disse feltnavnene
+BOARD_FIELDS = {"serviceDate": "service_date", "unitNumber": "unit_number", "time": "departure_time"}
+
+INSERT_SQL = f"""
+    INSERT INTO departures (service_date, unit_number, destination, departure_time, gate, type, status, comment, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT ({DEPARTURE_KEY}) DO NOTHING
+"""
+
+
+def prepare_frame(df):
+    """Validerer og normaliserer en importert tabell kolonnevis.
+
+    Returnerer de gyldige radene og antall rader som ble forkastet. Poster
+    med nettsidens feltnavn godtas også; uten driftsdag gjelder de i dag.
+    Andre poster må fortsatt ha driftsdag selv.
+    """
+    board = any(k in df.columns for k in BOARD_FIELDS)
+    df = df.rename(columns={k: v for k, v in BOARD_FIELDS.items() if k in df.columns and v not in df.columns})
+    if board:
+        # Nettsiden hadde ingen driftsdag før den fulgte én dag om gangen
+        today = date.today().isoformat()
+        df["service_date"] = df["service_date"].fillna(today) if "service_date" in df.columns else today
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Mangler kolonner: {', '.join(missing)}")
+
+    df = df.reindex(columns=COLUMNS)
+    df["status"] = df["status"].fillna("Planlagt")
+    df["comment"] = df["comment"].fillna("")
+    for col in COLUMNS:
+        df[col] = df[col].astype("string").str.strip()
+    df["unit_number"] = df["unit_number"].str.upper()
+
+    valid = (
+        df[REQUIRED_COLUMNS].notna().all(axis=1)
+        & (df[REQUIRED_COLUMNS] != "").all(axis=1)
+        & df["service_date"].str.fullmatch(r"\d{4}-\d{2}-\d{2}").fillna(False)
+        & df["departure_time"].str.fullmatch(r"\d{2}:\d{2}").fillna(False)
+    )
+    rows = df[valid].drop_duplicates(subset=DEPARTURE_KEY_COLUMNS)
+    return rows, int((~valid).sum())
+
+
+def insert_rows(pool, rows):
+    """Setter inn (service_date, ..., comment)-tupler i én transaksjon.
+
+    Duplikater mot den unike nøkkelen hoppes over av SQLite. Returnerer antall
+    nye rader.
+    """
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with pool.writer() as conn:
+        cur = conn.executemany(INSERT_SQL, ((*row, created_at) for row in rows))
+    return cur.rowcount
+
+
+def bulk_import(pool, df):
+    """Importerer en hel DataFrame. Returnerer (importert, hoppet over)."""
+    rows, _ = prepare_frame(df)
+    inserted = insert_rows(pool, rows.astype(object).itertuples(index=False, name=None))
+    return inserted, len(df) - inserted
+
+
+def import_stream(pool, fileobj, batch_size=BATCH_SIZE, progress=None):
+    """Importerer en JSON-liste eller JSON Lines-fil i faste porsjoner.
+
+    Hver porsjon valideres og settes inn for seg, så bare `batch_size` poster
+    ligger i minnet om gangen. `progress` kalles med andel lest (0–1) etter
+    hver porsjon når filstørrelsen er kjent. Returnerer (importert, hoppet over).
+    """
+    size = getattr(fileobj, "size", None)
+    inserted = skipped = 0
+    for batch in batched(iter_json_records(fileobj), batch_size):
+        if not all(isinstance(r, dict) for r in batch):
+            raise ValueError("Ugyldig format: forventet en liste av avganger")
+        n_inserted, n_skipped = bulk_import(pool, pd.DataFrame.from_records(batch))
+        inserted += n_inserted
+        skipped += n_skipped
+        if progress and size:
+            progress(min(fileobj.tell() / size, 1.0))
+    return inserted, skipped
@@ -0,0 +1,465 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# =======================
+# Lagring: snapshot + operasjonslogg
+# =======================
+# Snapshot-filen er den samme JSON-listen appene alltid har brukt. Hver
+# endring legges i tillegg til som én linje i en JSON Lines-logg ved siden av,
+# så en registrering skriver én linje i stedet for hele filen. Når loggen har
+# blitt lang nok, skrives et nytt snapshot og loggen tømmes (kompaktering).
+#
+# Alle skrivinger skjer under en fillås (<snapshot>.lock), så flere
+# Streamlit-prosesser kan dele samme filer. Snapshot skrives til en
+# midlertidig fil, fsync-es og flyttes på plass med os.replace, så et krasj
+# midt i skrivingen aldri etterlater en halv fil.
+#
+# Første linje i loggen er {"op": "base", "snapshot": <sha256>} for snapshotet
+# loggen bygger på. Krasjer en prosess etter at et nytt snapshot er flyttet
+# på plass, men før loggen er tømt, stemmer ikke sjekksummen lenger, og den
+# gamle loggen hoppes over i stedet for å spilles av på det nye snapshotet.
+COMPACT_AFTER = 500
+COMPACT_DELAY = 2.0  # sekunder; en serie endringer gir én kompaktering
+
+try:
+    import fcntl
+
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _try_lock(f):
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _try_lock(f):
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path):
+    """Eksklusiv lås på tvers av prosesser."""
+    with open(path, "a+") as f:
+        _lock(f)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def hold_lock(path):
+    """Prøver å ta en eksklusiv lås uten å vente.
+
+    Returnerer den åpne filen (låsen holdes til den lukkes eller prosessen
+    avslutter, også ved krasj), eller None hvis noen andre har låsen.
+    """
+    f = open(path, "a+")
+    if _try_lock(f):
+        return f
+    f.close()
+    return None
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """Skriver JSON til en temp-fil i samme mappe og bytter den inn atomisk."""
+    atomic_write(path, json.dumps(data, ensure_ascii=False, **dump_kwargs).encode("utf-8"))
+
+
+def atomic_write(path, data):
+    """Skriver bytes til en temp-fil i samme mappe og bytter den inn atomisk."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+
+def _fsync_dir(directory):
+    # Gjør selve navnebyttet varig; ikke mulig (eller nødvendig) på Windows
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def int_id(value):
+    """Id-en som heltall ("17" og 17.0 blir 17), eller None hvis den ikke er et."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _index_by_id(records):
+    # Id-er fra eldre importer kan være tekst; de gjøres om til heltall én
+    # gang her, så resten av koden (bl.a. DepartureTable) kan regne med int.
+    # Eldre filer kan også ha like id-er (to registreringer i samme sekund);
+    # de får en ny id så redigering og sletting treffer riktig post. Den nye
+    # id-en kommer fra samme generator som nye registreringer: max(id) + 1
+    # kunne havnet midt i en annen prosess' eller et senere millisekunds
+    # løpenumre og kollidert med en id som deles ut senere.
+    from ids import generate_id  # ids importerer hold_lock herfra
+
+    indexed = {}
+    for record in records:
+        record_id = int_id(record.get("id"))
+        if record_id is None or record_id in indexed:
+            record_id = generate_id()
+        record["id"] = record_id
+        indexed[record_id] = record
+    return indexed
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _base_line(digest):
+    return (json.dumps({"op": "base", "snapshot": digest}) + "\n").encode("utf-8")
+
+
+def _apply(records, entry):
+    op = entry.get("op")
+    if op == "put":
+        record = entry["record"]
+        records[record["id"]] = record
+    elif op == "delete":
+        records.pop(entry["id"], None)
+    elif op == "clear":
+        records.clear()
+
+
+class JsonlStore:
+    """Holder ingen poster i minnet selv; det gjør den som kaller load().
+
+    Lageret husker hvor langt i loggen (og hvilket snapshot) det sist leste,
+    så `read_changes` kan gi den som holder postene bare det som er nytt,
+    også endringer fra andre prosesser.
+    """
+
+    def __init__(self, snapshot_path, log_path=None, compact_after=COMPACT_AFTER, on_compact=None,
+                 compact_delay=COMPACT_DELAY):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path or os.path.splitext(snapshot_path)[0] + ".log.jsonl"
+        self.lock_path = snapshot_path + ".lock"
+        self.compact_after = compact_after
+        self.compact_delay = compact_delay
+        self.on_compact = on_compact
+        self._lock = threading.Lock()
+        self._log_lines = 0
+        self._compact_timer = None
+        # Gruppevis skriving av logglinjer (se _flush_until)
+        self._cond = threading.Condition()
+        self._pending = []
+        self._queued = 0
+        self._done = 0  # billetter til og med denne er skrevet (eller feilet)
+        self._flushing = False
+        self._failed = {}  # billett -> unntak for linjer som ikke ble skrevet
+        # Hva som sist er lest: snapshot-filens identitet og byte-posisjon i loggen
+        self._seen_snapshot = None
+        self._offset = 0
+
+    # --- Lasting ---
+    def load(self):
+        """Leser snapshot og spiller av loggen. Returnerer postene som liste."""
+        with file_lock(self.lock_path), self._lock:
+            records, self._offset = self._read_from_disk()
+            self._seen_snapshot = self._snapshot_signature()
+            return list(records.values())
+
+    def read_changes(self):
+        """Det som er skrevet til filene siden forrige load()/read_changes().
+
+        Returnerer None når ingenting er nytt, ("entries", oppføringer) når
+        bare loggen har vokst, og ("snapshot", poster) når snapshotet er
+        skrevet på nytt av en annen prosess og alt må lastes på nytt.
+        """
+        with file_lock(self.lock_path), self._lock:
+            with self._cond:
+                if self._done < self._queued:
+                    # Egne linjer venter på å bli skrevet, og endringene er
+                    # allerede lagt inn i minnet. Det som står før dem i
+                    # loggen, leses sammen med dem etterpå, i riktig rekkefølge.
+                    return None
+            signature = self._snapshot_signature()
+            if signature != self._seen_snapshot:
+                records, self._offset = self._read_from_disk()
+                self._seen_snapshot = signature
+                return "snapshot", list(records.values())
+            size = self._log_size()
+            if size < self._offset:
+                # Loggen er byttet ut uten nytt snapshot (se _read_from_disk)
+                records, self._offset = self._read_from_disk()
+                return "snapshot", list(records.values())
+            if size == self._offset:
+                return None
+            entries = []
+            self._offset = self._read_log(entries.append, self._offset)
+            return ("entries", entries) if entries else None
+
+    def _snapshot_signature(self):
+        # os.replace gir ny inode, så et nytt snapshot kjennes alltid igjen
+        try:
+            st = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    def _read_from_disk(self):
+        """Snapshot + hele loggen. Returnerer (poster som dict, posisjon i loggen).
+
+        Kalles under fillåsen.
+        """
+        records = {}
+        digest = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                raw = f.read()
+            digest = _digest(raw)
+            data = json.loads(raw)
+            if isinstance(data, list):
+                records = _index_by_id(data)
+        self._log_lines = 0
+        base = self._first_log_entry()
+        if base is not None and base.get("op") == "base" and base.get("snapshot") != digest:
+            # Loggen hører til snapshotet før dette (krasj før den ble tømt)
+            self._reset_log(digest)
+        offset = self._read_log(lambda entry: _apply(records, entry))
+        return records, offset
+
+    def _snapshot_digest(self):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                return _digest(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _first_log_entry(self):
+        try:
+            with open(self.log_path, "rb") as f:
+                line = f.readline()
+        except FileNotFoundError:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def _reset_log(self, digest):
+        """Ny, tom logg som bygger på snapshotet med sjekksum `digest`."""
+        atomic_write(self.log_path, _base_line(digest))
+
+    def _read_log(self, handle, offset=0):
+        """Gir hver hele logglinje fra `offset` til `handle`. Returnerer ny posisjon."""
+        if not os.path.exists(self.log_path):
+            return 0
+        # Binært: en halvskrevet linje kan slutte midt i et UTF-8-tegn
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # halvskrevet siste linje; leses når den er ferdig
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Rester etter et krasj midt i en skriving
+                    continue
+                if entry.get("op") == "base":
+                    continue
+                handle(entry)
+                self._log_lines += 1
+        return offset
+
+    # --- Endringer ---
+    # Med wait=False legges linjen bare i kø, og kallet returnerer en billett
+    # som gis til `wait` senere. Slik kan DepartureStore legge endringen i kø
+    # under sin egen lås og vente på skrivingen etter at låsen er sluppet.
+    def put(self, record, wait=True):
+        """Legger til eller oppdaterer én post (nøkkel: id)."""
+        return self._append([{"op": "put", "record": record}], wait)
+
+    def put_many(self, records, wait=True):
+        """Som `put` for hver post, men som én skriving og én fsync."""
+        return self._append([{"op": "put", "record": r} for r in records], wait)
+
+    def delete(self, record_id, wait=True):
+        return self._append([{"op": "delete", "id": record_id}], wait)
+
+    def clear(self, wait=True):
+        return self._append([{"op": "clear"}], wait)
+
+    def replace(self, records):
+        """Erstatter alt innhold, f.eks. ved import av backup.
+
+        Poster uten id eller med en id som allerede er brukt, får ny id.
+        """
+        with self._cond:
+            # Linjer i kø skal skrives før det nye snapshotet, ikke etter
+            self._flush_until(self._queued)
+        with file_lock(self.lock_path), self._lock:
+            self._write_snapshot(_index_by_id(records))
+            # Den som kaller har nå nøyaktig det som står på disk
+            self._seen_snapshot, self._offset = self._snapshot_signature(), self._log_size()
+
+    def _append(self, entries, wait):
+        if not entries:
+            return None
+        data = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in entries)
+        with self._cond:
+            self._pending.append(data)
+            self._queued += 1
+            ticket = self._queued
+        if not wait:
+            return ticket
+        self.wait(ticket)
+
+    def wait(self, ticket):
+        """Venter til linjene med denne billetten er skrevet.
+
+        Feiler skrivingen, kastes unntaket her, i tråden som la dem i kø.
+        """
+        if ticket is None:
+            return
+        with self._cond:
+            self._flush_until(ticket)
+            error = self._failed.pop(ticket, None)
+        if error is not None:
+            raise error
+
+    def _flush_until(self, ticket):
+        """Skriver køen til og med `ticket` er behandlet. Kalles med self._cond.
+
+        Tråder som venter mens en annen allerede skriver, venter bare; den som
+        skriver tar med hele køen i én write og én fsync. En serie klikk fra
+        flere økter blir dermed én flush. Feiler skrivingen, får alle
+        billettene i samme runde unntaket.
+        """
+        while self._done < ticket:
+            if self._flushing:
+                self._cond.wait()
+                continue
+            batch, self._pending = self._pending, []
+            upto = self._queued
+            first = upto - len(batch) + 1
+            self._flushing = True
+            self._cond.release()
+            error = None
+            try:
+                self._write_log(batch)
+            except Exception as e:
+                error = e
+            finally:
+                self._cond.acquire()
+                self._flushing = False
+                self._done = upto
+                if error is not None:
+                    for t in range(first, upto + 1):
+                        self._failed[t] = error
+                self._cond.notify_all()
+
+    def _write_log(self, lines):
+        data = "".join(lines).encode("utf-8")
+        count = data.count(b"\n")
+        with file_lock(self.lock_path):
+            with open(self.log_path, "a+b") as f:
+                f.seek(0, os.SEEK_END)
+                start = f.tell()
+                if not start:
+                    data = _base_line(self._snapshot_digest()) + data
+                else:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # En skriver krasjet midt i en linje; begynn på en ny,
+                        # ellers blir vår første linje en del av den ødelagte
+                        data = b"\n" + data
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                with self._lock:
+                    # Var vi à jour før denne skrivingen, er vi det fortsatt
+                    # (den som kaller har allerede lagt inn endringene selv)
+                    if start == self._offset:
+                        self._offset = f.tell()
+        with self._lock:
+            self._log_lines += count
+            if self._log_lines >= self.compact_after:
+                self._schedule_compaction()
+
+    # --- Kompaktering ---
+    def _schedule_compaction(self):
+        if self._compact_timer is None:
+            self._compact_timer = threading.Timer(self.compact_delay, self.compact)
+            self._compact_timer.daemon = True
+            self._compact_timer.start()
+
+    def compact(self):
+        """Skriver nytt snapshot fra filene på disk og tømmer loggen.
+
+        Tilstanden leses fra disk under låsen, så endringer fra andre
+        prosesser som bare ligger i loggen, kommer med i snapshotet.
+        """
+        with file_lock(self.lock_path), self._lock:
+            self._compact_timer = None
+            caught_up = (self._snapshot_signature() == self._seen_snapshot
+                         and self._log_size() == self._offset)
+            self._write_snapshot(self._read_from_disk()[0])
+            if caught_up:
+                self._seen_snapshot, self._offset = self._snapshot_signature(), self._log_size()
+            # Ellers har vi endringer fra andre prosesser til gode, og det
+            # nye snapshotet får read_changes til å laste alt på nytt
+
+    def _write_snapshot(self, records):
+        records = list(records.values())
+        data = json.dumps(records, ensure_ascii=False, indent=2).encode("utf-8")
+        atomic_write(self.snapshot_path, data)
+        # Krasjer vi her, har den gamle loggen feil sjekksum og hoppes over
+        self._reset_log(_digest(data))
+        self._log_lines = 0
+        if self.on_compact:
+            self.on_compact(records)
+
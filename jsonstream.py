@@ -0,0 +1,87 @@
+import codecs
+import json
+from itertools import islice
+
+# =======================
+# Inkrementell JSON-lesing
+# =======================
+CHUNK_SIZE = 64 * 1024
+MAX_RECORD_SIZE = 1024 * 1024  # tegn; en post som ikke kan leses innen dette, er ugyldig
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+def iter_json_records(fileobj, chunk_size=CHUNK_SIZE, max_record_size=MAX_RECORD_SIZE):
+    """Leser verdier én og én fra en JSON-liste eller en JSON Lines-fil.
+
+    Filen leses i biter på `chunk_size` byte, så minnebruken er uavhengig av
+    filstørrelsen så lenge hver enkelt post er liten. En post som fortsatt
+    ikke kan leses når over `max_record_size` tegn er lest inn, gir
+    ValueError i stedet for at resten av filen leses inn i minnet.
+    """
+    decode = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, eof = "", 0, False
+    in_array = None
+    count = 0  # poster lest så langt
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fileobj.read(chunk_size)
+        # Slutt avgjøres av selve lesingen: en bit kan dekodes til "" når
+        # den bare inneholder starten av et flerbytes tegn
+        eof = not chunk
+        if isinstance(chunk, bytes):
+            chunk = decode.decode(chunk, final=eof)
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        # Hopp over mellomrom og (i liste-modus) komma mellom postene
+        while True:
+            while pos < len(buf) and (buf[pos] in _WHITESPACE or (in_array and buf[pos] == ",")):
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+        if pos >= len(buf):
+            if in_array:
+                raise ValueError("Uventet slutt på filen: mangler ']'")
+            return
+
+        if in_array is None:
+            in_array = buf[pos] == "["
+            if in_array:
+                pos += 1
+                continue
+        if in_array and buf[pos] == "]":
+            return
+
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise
+            if len(buf) - pos > max_record_size:
+                raise ValueError(
+                    f"Post nr. {count + 1} kan ikke leses etter {max_record_size} tegn: {e.msg}"
+                ) from e
+            fill()
+            continue
+        if not eof and not isinstance(value, (dict, list, str)) and (end == len(buf) or buf[end] not in _DELIMITERS):
+            # Et tall kan fortsette i neste bit ("1." er ikke ferdig før vi
+            # ser hva som kommer etter); vent til noe avslutter det
+            if len(buf) - pos > max_record_size:
+                raise ValueError(f"Post nr. {count + 1} er lengre enn {max_record_size} tegn")
+            fill()
+            continue
+        pos = end
+        count += 1
+        yield value
+
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
@@ -0,0 +1,31 @@
+import math
+
+import streamlit as st
+
+# =======================
+# Sidevis visning av lange lister
+# =======================
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def page_window(total, key, default_size=50):
+    """Viser sidevalg og returnerer (start, stopp) for radene som skal vises.
+
+    Bare radene på gjeldende side får egne kolonner og knapper, så antall
+    widgets per kjøring er begrenset av sidestørrelsen. En tom liste gir
+    (0, 0) uten sidevalg.
+    """
+    if total == 0:
+        return 0, 0
+    c1, c2, c3 = st.columns([2, 2, 4])
+    with c1:
+        size = st.selectbox("Rader per side", PAGE_SIZES, index=PAGE_SIZES.index(default_size), key=f"{key}_size")
+    pages = max(1, math.ceil(total / size))
+    page_key = f"{key}_page"
+    st.session_state[page_key] = min(st.session_state.get(page_key, 1), pages)
+    with c2:
+        page = st.number_input("Side", min_value=1, max_value=pages, step=1, key=page_key)
+    with c3:
+        st.caption(f"Side {page} av {pages} · {total} avganger")
+    start = (page - 1) * size
+    return start, start + size
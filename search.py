@@ -0,0 +1,63 @@
+import pandas as pd
+
+from db import keyset_condition, order_by
+
+# =======================
+# Fulltekstsøk (FTS5)
+# =======================
+
+
+def fts_query(text):
+    """Gjør fritekst om til et FTS5-uttrykk der hvert ord er et prefikssøk.
+
+    "tog0 molde" blir '"tog0"* "molde"*', dvs. begge ordene må treffe
+    starten av et ord i enhet, luke, destinasjon eller kommentar.
+    """
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+def search_query(text, day=None, dest_filter="", sort_key="rank", limit=None, after=None):
+    """SQL og parametre for et søk, rangert etter treff (bm25) som standard.
+
+    I tillegg til fulltekstsøket treffer søket hvor som helst i
+    enhetsnummeret, som før (TOG12 finner også XTOG123). Den delen sjekkes
+    bare for radene i utvalget; med `day` avgrenser dagsindeksen hvilke
+    rader som leses. Treff bare på enhetsnummer kommer etter
+    fulltekst-treffene.
+
+    `after` er markøren for neste side: siste rads sorteringsverdier for
+    "time"/"dest", eller antall rader allerede vist for "rank".
+    """
+    where = ["(f.rowid IS NOT NULL OR instr(d.unit_number, ?) > 0)"]
+    args = [fts_query(text), text.strip().upper()]
+    if day:
+        where.append("d.service_date = ?")
+        args.append(day)
+    if dest_filter:
+        where.append("d.destination = ?")
+        args.append(dest_filter)
+    offset = 0
+    if sort_key == "rank":
+        order = "f.rank IS NULL, f.rank, d.departure_time, d.id"
+        offset = after or 0
+    else:
+        order = order_by(sort_key, "d.")
+        if after is not None:
+            where.append(keyset_condition(sort_key, "d."))
+            args.extend(after)
+    query = f"""
+        WITH hits AS MATERIALIZED (
+            SELECT rowid, rank FROM departures_fts WHERE departures_fts MATCH ?
+        )
+        SELECT d.* FROM departures d LEFT JOIN hits f ON f.rowid = d.id
+        WHERE {" AND ".join(where)}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+    """
+    args.extend([limit or -1, offset])
+    return query, args
+
+
+def search_departures(pool, text, day=None, dest_filter="", sort_key="rank", limit=None, after=None):
+    query, args = search_query(text, day, dest_filter, sort_key, limit, after)
+    return pd.read_sql_query(query, pool.reader(), params=args)
@@ -0,0 +1,39 @@
+from collections import Counter
+
+# =======================
+# Statistikk i én spørring
+# =======================
+# Typer registreres på norsk eller engelsk avhengig av språkvalget.
+TYPE_GROUPS = {
+    "trains": ("tog", "train"),
+    "cars": ("bil", "car"),
+    "trailers": ("tralle", "trailer"),
+    "modules": ("modul", "module"),
+}
+_TYPE_GROUP_OF = {name: group for group, names in TYPE_GROUPS.items() for name in names}
+
+
+def day_statistics(pool, day):
+    """Alle tall til statistikkortene for én dag.
+
+    Én GROUP BY over dagens rader (via service_date-indeksen) gir noen få
+    grupper, som så summeres til totalt, per typegruppe, per status og per
+    destinasjon.
+    """
+    rows = pool.reader().execute("""
+        SELECT type, status, destination, COUNT(*)
+        FROM departures WHERE service_date = ?
+        GROUP BY type, status, destination
+    """, (day,))
+    stats = {"total": 0, **dict.fromkeys(TYPE_GROUPS, 0)}
+    by_status, by_destination = Counter(), Counter()
+    for typ, status, destination, count in rows:
+        stats["total"] += count
+        group = _TYPE_GROUP_OF.get(typ.lower())
+        if group:
+            stats[group] += count
+        by_status[status] += count
+        by_destination[destination] += count
+    stats["by_status"] = dict(by_status)
+    stats["by_destination"] = dict(by_destination)
+    return stats
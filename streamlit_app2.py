@@ -1,28 +1,40 @@
 import streamlit as st
-import pandas as pd
-import json
-from datetime import datetime
+
+from columnar import ColumnBuffer
+from departure_store import get_departure_store
+from ids import generate_id
 
 # --- Datahåndtering ---
 DATA_FILE = "departures.json"
 
-def load_data():
-    try:
-        with open(DATA_FILE, "r") as f:
-            return pd.DataFrame(json.load(f))
-    except:
-        return pd.DataFrame(columns=["id", "unitNumber", "destination", "time", "gate", "type", "status", "comment"])
+COLUMNS = ["id", "unitNumber", "destination", "time", "gate", "type", "status", "comment"]
 
-def save_data(df):
-    with open(DATA_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f, indent=2)
+# Tabellen holdes kolonnevis og deles av alle økter; den lastes på nytt fra
+# lageret bare når noe annet enn en registrering herfra har endret det.
+@st.cache_resource
+def get_buffer():
+    return ColumnBuffer(COLUMNS)
+
+def load_data():
+    buffer = get_buffer()
+    revision = store.revision  # leses før listen, så en samtidig endring gir ny lasting
+    if buffer.revision != revision:
+        buffer.reset(store.all(), revision)
+    return buffer
 
 # --- UI ---
 st.set_page_config("🚛 Transportsystem", layout="wide")
 st.title("🚛 Transportsystem")
 st.markdown("Registrering og oversikt over alle avganger")
 
-df = load_data()
+# Snapshot + endringslogg (departures.log.jsonl): hver registrering skriver én linje
+try:
+    store = get_departure_store(DATA_FILE)
+except Exception as e:
+    st.error(f"Kunne ikke lese {DATA_FILE}: {e}")
+    st.stop()
+
+buffer = load_data()
 
 with st.form("registrer_avgang"):
     col1, col2 = st.columns(2)
@@ -36,11 +48,11 @@ with st.form("registrer_avgang"):
     if st.form_submit_button("✅ Registrer"):
         if not unit or not dest or not gate or not typ or not status:
             st.error("Vennligst fyll ut alle obligatoriske felt.")
-        elif unit in df["unitNumber"].values:
+        elif store.unit_exists(unit):
             st.warning("Enhetsnummer eksisterer allerede!")
         else:
             new_row = {
-                "id": int(datetime.now().timestamp()),
+                "id": generate_id(),
                 "unitNumber": unit,
                 "destination": dest,
                 "time": time.strftime("%H:%M"),
@@ -49,12 +61,12 @@ with st.form("registrer_avgang"):
                 "status": status,
                 "comment": comment or ""
             }
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-            save_data(df)
+            buffer.append(new_row, store.add(new_row))
             st.success("Avgang registrert!")
             st.rerun()
 
 # Vis tabell
+df = buffer.to_frame()
 st.dataframe(df, use_container_width=True)
 
 # Eksporter
@@ -0,0 +1,59 @@
+import html
+from functools import partial
+
+# =======================
+# HTML-tabell for oversikten
+# =======================
+TYPE_COLORS = {
+    "Tog": "#e74c3c", "Train": "#e74c3c",
+    "Bil": "#f39c12", "Car": "#f39c12",
+    "Tralle": "#3498db", "Trailer": "#3498db",
+}
+DEFAULT_TYPE_COLOR = "#9b59b6"
+STATUS_COLORS = {"LEVERT": "#27ae60", "LAGER": "#3498db"}
+DEFAULT_STATUS_COLOR = "#e67e22"
+
+TABLE_HEAD = (
+    "<table><thead><tr><th>Enhetsnummer</th><th>Destinasjon</th><th>Tid</th><th>Gate</th>"
+    "<th>Type</th><th>Status</th><th>Kommentar</th><th>Handlinger</th></tr></thead><tbody>"
+)
+TABLE_TAIL = "</tbody></table>"
+
+# Radmalen kompileres én gang; .format fylles med én kolonne per plassholder.
+ROW_TEMPLATE = (
+    "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td>"
+    "<td><span style='color:{};font-weight:bold'>{}</span></td>"
+    "<td><span style='color:{};font-weight:bold'>{}</span></td>"
+    "<td>{}</td>"
+    "<td class='action-buttons'>"
+    "<button class='btn btn-secondary' onclick='edit({})'>✏️ {edit}</button>"
+    "<button class='btn btn-danger' onclick='del({})'>🗑️ {delete}</button>"
+    "</td></tr>"
+)
+
+
+def _escaped(col):
+    # astype(object) først: fillna("") feiler på kategorikolonner
+    return [html.escape(v) for v in col.astype(object).fillna("").astype(str).tolist()]
+
+
+def _colors(col, colors, default):
+    return [colors.get(v, default) for v in col.tolist()]
+
+
+def render_departure_table(df, edit_label, delete_label):
+    """Bygger hele tabellen kolonnevis og setter den sammen med én join."""
+    if df.empty:
+        return TABLE_HEAD + TABLE_TAIL
+    type_color = _colors(df["type"], TYPE_COLORS, DEFAULT_TYPE_COLOR)
+    status_color = _colors(df["status"], STATUS_COLORS, DEFAULT_STATUS_COLOR)
+    comment = [c or "—" for c in _escaped(df["comment"])]
+    ids = df["id"].tolist()
+    row = partial(ROW_TEMPLATE.format, edit=html.escape(edit_label), delete=html.escape(delete_label))
+
+    rows = map(
+        row,
+        _escaped(df["unit_number"]), _escaped(df["destination"]), _escaped(df["departure_time"]), _escaped(df["gate"]),
+        type_color, _escaped(df["type"]), status_color, _escaped(df["status"]), comment, ids, ids,
+    )
+    return TABLE_HEAD + "".join(rows) + TABLE_TAIL
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from departure_store import DepartureStore
+from jsonl_store import JsonlStore
+
+
+def _stores(tmp_path, **kwargs):
+    # To lagre på samme fil, slik to apper (prosesser) har hver sin
+    path = str(tmp_path / "departures.json")
+    return DepartureStore(JsonlStore(path, **kwargs)), DepartureStore(JsonlStore(path, **kwargs))
+
+
+def test_writes_from_another_store_are_picked_up(tmp_path):
+    a, b = _stores(tmp_path)
+    a.add({"id": 1, "unitNumber": "TOG1"})
+    assert b.unit_exists("TOG1")
+    a.update(1, {"unitNumber": "TOG2"})
+    a.add({"id": 2, "unitNumber": "BIL1"})
+    assert sorted(r["unitNumber"] for r in b.all()) == ["BIL1", "TOG2"]
+    a.delete(1)
+    assert [r["id"] for r in b.all()] == [2]
+
+
+def test_revision_moves_when_another_store_writes(tmp_path):
+    a, b = _stores(tmp_path)
+    before = b.revision
+    assert b.revision == before
+    a.add({"id": 1, "unitNumber": "TOG1"})
+    assert b.revision > before
+
+
+def test_own_writes_are_not_replayed(tmp_path):
+    a, _ = _stores(tmp_path)
+    revision = a.add({"id": 1, "unitNumber": "TOG1"})
+    assert a.revision == revision
+
+
+def test_compaction_and_replace_in_another_store(tmp_path):
+    a, b = _stores(tmp_path, compact_after=10_000)
+    b.all()
+    a.add({"id": 1, "unitNumber": "TOG1"})
+    a.storage.compact()
+    a.add({"id": 2, "unitNumber": "TOG2"})
+    assert sorted(r["id"] for r in b.all()) == [1, 2]
+    a.replace([{"id": 7, "unitNumber": "NY"}])
+    assert [r["id"] for r in b.all()] == [7]
+    assert [r["id"] for r in a.all()] == [7]
+
+
+def test_compaction_while_behind_reloads_later(tmp_path):
+    a, b = _stores(tmp_path, compact_after=10_000)
+    b.add({"id": 1, "unitNumber": "TOG1"})
+    a.storage.compact()  # a har ikke lest b sin linje ennå
+    assert [r["id"] for r in a.all()] == [1]
+
+
+def _count_writes(store, monkeypatch, delay=0.0):
+    calls = []
+    write_log = store.storage._write_log
+
+    def counting(lines):
+        calls.append(len(lines))
+        time.sleep(delay)  # en treg disk gir de andre trådene tid til å legge seg i kø
+        write_log(lines)
+
+    monkeypatch.setattr(store.storage, "_write_log", counting)
+    return calls
+
+
+def test_concurrent_adds_share_flushes(tmp_path, monkeypatch):
+    store, _ = _stores(tmp_path)
+    calls = _count_writes(store, monkeypatch, delay=0.05)
+    start = threading.Barrier(8)
+
+    def add(i):
+        start.wait()
+        store.add({"id": i, "unitNumber": f"TOG{i}"})
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) < 8
+    assert sum(calls) == 8
+    assert sorted(r["id"] for r in _stores(tmp_path)[1].all()) == list(range(8))
+
+
+def test_merge_is_one_write(tmp_path, monkeypatch):
+    store, _ = _stores(tmp_path)
+    calls = _count_writes(store, monkeypatch)
+    assert store.merge([{"id": i, "unitNumber": f"TOG{i}"} for i in range(50)]) == 50
+    assert calls == [1]
+
+
+def test_failed_write_is_rolled_back(tmp_path, monkeypatch):
+    store, _ = _stores(tmp_path)
+    store.add({"id": 1, "unitNumber": "TOG1"})
+
+    def failing(lines):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store.storage, "_write_log", failing)
+    with pytest.raises(OSError):
+        store.add({"id": 2, "unitNumber": "TOG2"})
+    with pytest.raises(OSError):
+        store.update(1, {"unitNumber": "TOG9"})
+    with pytest.raises(OSError):
+        store.delete(1)
+    assert [(r["id"], r["unitNumber"]) for r in store.all()] == [(1, "TOG1")]
+
+
+def test_legacy_text_ids_become_integers(tmp_path, monkeypatch):
+    from columnar import DepartureTable
+
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "departures.json"
+    path.write_text('[{"id": "17", "unitNumber": "TOG1", "time": "08:30"}, {"id": "x", "unitNumber": "TOG2"}]')
+    store, _ = _stores(tmp_path)
+    assert store.merge([{"id": "18", "unitNumber": "BIL1"}, {"id": 17.0, "unitNumber": "TOG1"}]) == 1
+    ids = [r["id"] for r in store.all()]
+    assert all(type(i) is int for i in ids) and ids[0] == 17 and 18 in ids
+
+    table = DepartureTable(store.all())
+    assert table.frame["id"].dtype == "int64"
+    assert table.filter("TOG1") == [17]
+    assert table.frame["minutes"].tolist()[0] == 8 * 60 + 30
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import threading
+
+import ids
+from ids import MAX_WORKER, SEQUENCE_BITS, IdGenerator, reserve_worker
+
+
+def _worker(id_):
+    return (id_ >> SEQUENCE_BITS) & MAX_WORKER
+
+
+def test_ids_are_unique_and_increasing_across_threads():
+    generator = IdGenerator(3)
+    out = []
+
+    def run():
+        out.extend(generator.next_id() for _ in range(5000))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(out)) == len(out)
+    assert all(_worker(i) == 3 for i in out)
+    assert max(out) < 2 ** 53
+
+
+def test_reserved_workers_are_distinct(tmp_path):
+    held = [reserve_worker(str(tmp_path)) for _ in range(3)]
+    assert sorted(w for w, _ in held) == [0, 1, 2]
+    held[1][1].close()  # frigitt nummer kan tas igjen
+    assert reserve_worker(str(tmp_path))[0] == 1
+
+
+def test_processes_get_different_workers(tmp_path):
+    code = "import ids; print(ids.generate_id())"
+    procs = [subprocess.Popen([sys.executable, "-c", code + "; import time; time.sleep(1)"],
+                              cwd=tmp_path, stdout=subprocess.PIPE, text=True,
+                              env={"PYTHONPATH": os.path.dirname(ids.__file__)})
+             for _ in range(3)]
+    workers = {_worker(int(p.communicate()[0])) for p in procs}
+    assert len(workers) == 3
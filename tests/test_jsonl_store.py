@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from jsonl_store import JsonlStore
+
+
+def _store(tmp_path, **kwargs):
+    return JsonlStore(str(tmp_path / "departures.json"), **kwargs)
+
+
+def test_append_after_torn_line_survives_reload(tmp_path):
+    store = _store(tmp_path)
+    store.put({"id": 1, "unitNumber": "A"})
+    # Et krasj midt i en skriving etterlater en halv linje uten linjeskift
+    with open(store.log_path, "a", encoding="utf-8") as f:
+        f.write('{"op":"put","record":{"id":2,"unitN')
+
+    store.put({"id": 3, "unitNumber": "C"})
+
+    records = {r["id"]: r for r in _store(tmp_path).load()}
+    assert sorted(records) == [1, 3]
+
+
+def test_torn_multibyte_tail_is_skipped(tmp_path):
+    store = _store(tmp_path)
+    store.put({"id": 1, "unitNumber": "Å"})
+    with open(store.log_path, "ab") as f:
+        f.write('{"op":"put","record":{"id":2,"unitNumber":"Ø'.encode("utf-8")[:-1])
+
+    assert [r["id"] for r in _store(tmp_path).load()] == [1]
+
+
+def test_failed_flush_raises_in_every_waiting_thread(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def failing_write(lines):
+        calls.append(list(lines))
+        if len(calls) == 1:
+            # Hold første runde åpen så de andre trådene legger seg i kø
+            started.set()
+            release.wait(5)
+            return
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_write_log", failing_write)
+    errors = []
+
+    def put(i):
+        try:
+            store.put({"id": i})
+        except OSError as e:
+            errors.append((i, e))
+
+    first = threading.Thread(target=put, args=(0,))
+    first.start()
+    started.wait(5)
+    others = [threading.Thread(target=put, args=(i,)) for i in range(1, 4)]
+    for t in others:
+        t.start()
+    while len(store._pending) < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [first, *others]:
+        t.join(5)
+
+    assert sorted(i for i, _ in errors) == [1, 2, 3]
+    assert store._failed == {}
+
+
+def test_later_success_does_not_hide_earlier_failure(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    outcomes = iter([OSError("disk full"), None])
+
+    def write(lines):
+        error = next(outcomes)
+        if error:
+            raise error
+
+    monkeypatch.setattr(store, "_write_log", write)
+    with pytest.raises(OSError):
+        store.put({"id": 1})
+    store.put({"id": 2})
+    assert store._failed == {}
+
+
+def _crash_before_log_reset(store, monkeypatch):
+    def crash(digest):
+        raise RuntimeError("krasj")
+
+    monkeypatch.setattr(store, "_reset_log", crash)
+
+
+def test_crash_after_replace_swap_ignores_old_log(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.put({"id": 1, "unitNumber": "GAMMEL"})
+    store.delete(1)
+    store.put({"id": 2, "unitNumber": "GAMMEL"})
+    _crash_before_log_reset(store, monkeypatch)
+    with pytest.raises(RuntimeError):
+        store.replace([{"id": 1, "unitNumber": "NY"}])
+
+    reloaded = _store(tmp_path)
+    assert [(r["id"], r["unitNumber"]) for r in reloaded.load()] == [(1, "NY")]
+    # Loggen er startet på nytt, så nye linjer kommer med neste gang
+    reloaded.put({"id": 3, "unitNumber": "C"})
+    assert sorted(r["id"] for r in _store(tmp_path).load()) == [1, 3]
+
+
+def test_crash_after_compaction_swap_keeps_everything(tmp_path, monkeypatch):
+    store = _store(tmp_path, compact_after=10_000)
+    store.put({"id": 1, "unitNumber": "A"})
+    store.put({"id": 2, "unitNumber": "B"})
+    store.compact()
+    store.put({"id": 3, "unitNumber": "C"})
+    store.delete(1)
+    _crash_before_log_reset(store, monkeypatch)
+    with pytest.raises(RuntimeError):
+        store.compact()
+
+    assert sorted(r["id"] for r in _store(tmp_path).load()) == [2, 3]
+
+
+def test_log_without_base_line_is_replayed(tmp_path):
+    store = _store(tmp_path)
+    store.replace([{"id": 1, "unitNumber": "A"}])
+    # Logg skrevet av en eldre versjon, uten base-linje
+    with open(store.log_path, "w", encoding="utf-8") as f:
+        f.write('{"op":"put","record":{"id":2,"unitNumber":"B"}}\n')
+
+    assert sorted(r["id"] for r in _store(tmp_path).load()) == [1, 2]
+
+
+def test_missing_and_duplicate_ids_get_generated_ids(tmp_path, monkeypatch):
+    import ids
+
+    monkeypatch.chdir(tmp_path)  # låsfilen for worker-nummeret havner her
+    store = _store(tmp_path)
+    store.replace([{"id": 5, "unitNumber": "A"}, {"id": 5, "unitNumber": "B"}, {"unitNumber": "C"}])
+    records = {r["unitNumber"]: r["id"] for r in _store(tmp_path).load()}
+    assert records["A"] == 5
+    assert records["B"] > ids.EPOCH_MS and records["C"] > records["B"]
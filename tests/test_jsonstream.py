@@ -0,0 +1,56 @@
+import io
+import json
+
+import pytest
+
+from jsonstream import batched, iter_json_records
+
+VALUES = [1.5, 2, -30e-2, True, None, "Ålesund – Førde", {"unitNumber": "TOG1", "destination": "FØRDE"}, [1, 2.25]]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 8))
+def test_array_with_scalars_and_non_ascii_in_small_chunks(chunk_size):
+    data = json.dumps(VALUES, ensure_ascii=False).encode("utf-8")
+    assert list(iter_json_records(io.BytesIO(data), chunk_size)) == VALUES
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3])
+def test_number_split_across_chunks(chunk_size):
+    assert list(iter_json_records(io.BytesIO(b"[1.5, 2]"), chunk_size)) == [1.5, 2]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 6))
+def test_json_lines_in_small_chunks(chunk_size):
+    data = "\n".join(json.dumps(v, ensure_ascii=False) for v in VALUES).encode("utf-8")
+    assert list(iter_json_records(io.BytesIO(data), chunk_size)) == VALUES
+
+
+def test_text_file_and_bom():
+    assert list(iter_json_records(io.StringIO('[{"a": "ø"}, 12]'))) == [{"a": "ø"}, 12]
+    assert list(iter_json_records(io.BytesIO(b'\xef\xbb\xbf[7]'), 2)) == [7]
+
+
+def test_unterminated_array_raises():
+    with pytest.raises(ValueError):
+        list(iter_json_records(io.BytesIO(b"[1, 2"), 2))
+
+
+def test_malformed_record_stops_reading_early():
+    class Source(io.BytesIO):
+        read_bytes = 0
+
+        def read(self, size=-1):
+            chunk = super().read(size)
+            self.read_bytes += len(chunk)
+            return chunk
+
+    source = Source(b'[{"a": 1}, {"a": oops}, ' + b'{"a": 2}, ' * 10_000 + b"]")
+    records = iter_json_records(source, chunk_size=16, max_record_size=64)
+    assert next(records) == {"a": 1}
+    with pytest.raises(ValueError, match="Post nr. 2"):
+        next(records)
+    assert source.read_bytes < 200
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
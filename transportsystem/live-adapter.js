@@ -0,0 +1,236 @@
+// =======================
+// Lokal erstatning for firebase.database()
+// =======================
+// Snakker med api.py i stedet for Firebase: skriving går som enkeltkall mot
+// REST-API-et (/api/departures), og endringer kommer tilbake som
+// Server-Sent Events fra /api/events, én hendelse per avgang. Alle tavler
+// får dermed bare det som faktisk er endret, i stedet for hele listen.
+//
+// Tavlen følger én driftsdag (standard: i dag): den får bare den dagens
+// avganger, nye avganger lagres på den, og "slett alle"/"erstatt alle"
+// gjelder bare den. Historikken i databasen ellers røres ikke.
+//
+// Bruk:
+//   const database = LiveDatabase.connect('/api', { day: '2026-10-17' });
+//   const departuresRef = database.ref('departures');
+//   departuresRef.on('value', snapshot => ...);          // hele listen (samlet per runde)
+//   departuresRef.on('child_changed', snapshot => ...);  // også child_added/child_removed
+//   departuresRef.push(data);                            // ny avgang
+//   departuresRef.child(id).set(data);                   // oppdater
+//   departuresRef.child(id).remove();                    // slett
+//   departuresRef.remove();                              // slett alle (denne dagen)
+//   departuresRef.set(list);                             // erstatt alle (denne dagen)
+//   departuresRef.upload(list);                          // legg til mange (ikke i Firebase)
+//   database.ready                                       // true når første synk er ferdig
+//
+// Alle skrivekall returnerer et Promise som avvises med en Error (med
+// .status fra API-et, f.eks. 409 for duplikat) hvis serveren sier nei.
+(function (global) {
+  'use strict';
+
+  const EVENTS = ['value', 'child_added', 'child_changed', 'child_removed'];
+  const VALUE_DELAY = 16; // ms: endringer som kommer tett samles til én 'value'
+
+  function localDate() {
+    return new Date().toLocaleDateString('sv-SE'); // YYYY-MM-DD i lokal tid
+  }
+
+  // API-ets feltnavn <-> feltnavnene i script.js
+  function toClient(row) {
+    return {
+      id: row.id,
+      serviceDate: row.service_date,
+      unitNumber: row.unit_number,
+      destination: row.destination,
+      time: row.departure_time,
+      gate: row.gate,
+      type: row.type,
+      status: row.status,
+      comment: row.comment || null
+    };
+  }
+
+  function toServer(d, day) {
+    return {
+      service_date: d.serviceDate || day,
+      unit_number: d.unitNumber,
+      destination: d.destination,
+      departure_time: d.time,
+      gate: d.gate,
+      type: d.type,
+      status: d.status,
+      comment: d.comment || ''
+    };
+  }
+
+  class Snapshot {
+    constructor(key, value) {
+      this.key = key;
+      this._value = value;
+    }
+    val() { return this._value; }
+    exists() { return this._value !== null && this._value !== undefined; }
+  }
+
+  class LiveDatabase {
+    constructor(baseUrl, options = {}) {
+      this.baseUrl = baseUrl.replace(/\/$/, '');
+      this.day = options.day || localDate(); // driftsdagen tavlen viser
+      this.records = new Map();       // id -> avgang, i revisjonsrekkefølge
+      this.listeners = {};
+      EVENTS.forEach(e => { this.listeners[e] = new Set(); });
+      this.ready = false;
+      this.source = null;
+      this._valueTimer = null;
+    }
+
+    static connect(baseUrl = '/api', options = {}) {
+      return new LiveDatabase(baseUrl, options);
+    }
+
+    ref(path) {
+      if (path !== 'departures') throw new Error(`Ukjent sti: ${path}`);
+      return new LiveRef(this, null);
+    }
+
+    // --- Mottak ---
+    _connect() {
+      if (this.source) return;
+      // EventSource kobler selv til igjen og sender Last-Event-ID, så
+      // serveren sender bare det vi gikk glipp av.
+      this.source = new EventSource(`${this.baseUrl}/events?day=${encodeURIComponent(this.day)}`);
+      this.source.addEventListener('change', e => this._apply(JSON.parse(e.data)));
+      this.source.addEventListener('reset', () => this._reset());
+      this.source.addEventListener('ready', () => {
+        this.ready = true;
+        this._scheduleValue();
+      });
+    }
+
+    _apply(change) {
+      const old = this.records.get(change.id);
+      // Serveren sender bare dagens endringer; dette er en ekstra sikring
+      const outside = change.op === 'upsert' && change.departure.service_date !== this.day;
+      if (change.op === 'delete' || outside) {
+        if (old === undefined) return;
+        this.records.delete(change.id);
+        this._emit('child_removed', change.id, old);
+      } else {
+        const record = toClient(change.departure);
+        this.records.set(change.id, record);
+        this._emit(old === undefined ? 'child_added' : 'child_changed', change.id, record);
+      }
+      this._scheduleValue();
+    }
+
+    _reset() {
+      // Serveren sender hele listen på nytt etterpå
+      const old = this.records;
+      this.records = new Map();
+      this.ready = false;
+      old.forEach((record, id) => this._emit('child_removed', id, record));
+    }
+
+    _emit(event, key, value) {
+      const snapshot = new Snapshot(key, value);
+      this.listeners[event].forEach(cb => cb(snapshot));
+    }
+
+    _scheduleValue() {
+      if (!this.ready || this._valueTimer !== null) return;
+      this._valueTimer = setTimeout(() => {
+        this._valueTimer = null;
+        this._emitValue();
+      }, VALUE_DELAY);
+    }
+
+    _emitValue() {
+      this._emit('value', null, Object.fromEntries(this.records));
+    }
+
+    _on(event, cb) {
+      if (!this.listeners[event]) throw new Error(`Ukjent hendelse: ${event}`);
+      this.listeners[event].add(cb);
+      // Som i Firebase: nye lyttere får det som allerede er lastet
+      if (event === 'value' && this.ready) cb(new Snapshot(null, Object.fromEntries(this.records)));
+      if (event === 'child_added') this.records.forEach((record, id) => cb(new Snapshot(id, record)));
+      this._connect();
+      return cb;
+    }
+
+    _off(event, cb) {
+      if (cb) this.listeners[event].delete(cb);
+      else this.listeners[event].clear();
+    }
+
+    // --- Skriving ---
+    async _request(method, path, body, isForm = false) {
+      const init = { method };
+      if (body !== undefined) {
+        init.body = isForm ? body : JSON.stringify(body);
+        if (!isForm) init.headers = { 'Content-Type': 'application/json' };
+      }
+      const res = await fetch(this.baseUrl + path, init);
+      if (!res.ok) {
+        let detail = res.statusText;
+        try { detail = (await res.json()).detail || detail; } catch (e) { /* ikke JSON */ }
+        const err = new Error(typeof detail === 'string' ? detail : JSON.stringify(detail));
+        err.status = res.status;
+        throw err;
+      }
+      return res.status === 204 ? null : res.json();
+    }
+
+    _upload(list) {
+      // Importerte avganger legges på tavlens dag, også fra eldre backuper
+      const lines = list.map(d => JSON.stringify(toServer({ ...d, serviceDate: this.day }, this.day))).join('\n');
+      const form = new FormData();
+      form.append('file', new Blob([lines], { type: 'application/x-ndjson' }), 'import.jsonl');
+      return this._request('POST', '/upload', form, true);
+    }
+  }
+
+  class LiveRef {
+    constructor(db, key) {
+      this.db = db;
+      this.key = key;
+    }
+
+    child(key) {
+      return new LiveRef(this.db, Number(key));
+    }
+
+    on(event, cb) { return this.db._on(event, cb); }
+    off(event, cb) { this.db._off(event, cb); }
+
+    async push(value) {
+      const row = await this.db._request('POST', '/departures', toServer(value, this.db.day));
+      return new LiveRef(this.db, row.id);
+    }
+
+    async set(value) {
+      if (this.key === null) {
+        // Hele dagen: tøm og last opp på nytt (to kall, ikke atomisk)
+        const list = value ? Object.values(value) : [];
+        await this.remove();
+        if (list.length) await this.db._upload(list);
+        return;
+      }
+      if (value === null) return this.remove();
+      await this.db._request('PUT', `/departures/${this.key}`, toServer(value, this.db.day));
+    }
+
+    async remove() {
+      const path = this.key === null
+        ? `/departures?day=${encodeURIComponent(this.db.day)}`
+        : `/departures/${this.key}`;
+      await this.db._request('DELETE', path);
+    }
+
+    upload(list) {
+      return this.db._upload(list);
+    }
+  }
+
+  global.LiveDatabase = LiveDatabase;
+})(window);
@@ -0,0 +1,219 @@
+// =======================
+// Avgangstabell med nøklede rader
+// =======================
+// Hver avgang har sin egen <tr>, nøklet på id. En endring fyller bare den
+// ene raden på nytt, og filter/sortering flytter eksisterende rader i
+// stedet for å bygge hele tabellen som én HTML-streng. Endringer samles og
+// tegnes én gang per skjermbilde (requestAnimationFrame).
+(function (global) {
+  'use strict';
+
+  const TYPE_ICONS = {
+    Tog: '🚂',
+    Bil: '🚗',
+    Tralle: '🛒',
+    Modul: '📦'
+  };
+
+  const TYPE_COLORS = { Tog: '#e74c3c', Bil: '#f31230ff', Tralle: '#3498db' };
+  const DEFAULT_TYPE_COLOR = '#9b59b6';
+
+  // Farger for hver status
+  const STATUS_COLORS = {
+    'LEVERT': '#37f308ff',     // Grønn (suksess)
+    'LAGER': '#3498db',        // Blå (info)
+    'planlaget': '#eb960fff',  // Oransje (advarsel)
+    'LASTER NÅ': '#e62222ff'   // Mørk oransje (aktiv)
+  };
+  const DEFAULT_STATUS_COLOR = '#808080'; // Grå som fallback
+
+  const FIELDS = ['unitNumber', 'destination', 'time', 'gate', 'type', 'status', 'comment'];
+
+  // Søket treffer enhetsnummer eller destinasjon; nøkkelen lages én gang per
+  // endring, ikke én gang per rad per tastetrykk.
+  function searchKey(d) {
+    return `${d.unitNumber || ''}\n${d.destination || ''}`.toLowerCase();
+  }
+
+  function sameRecord(a, b) {
+    return FIELDS.every(f => a[f] === b[f]);
+  }
+
+  function createRow(id) {
+    const tr = document.createElement('tr');
+    tr.dataset.id = id;
+    tr.innerHTML = `
+      <td></td><td></td><td></td><td></td>
+      <td><span class="type-icon"></span><span style="font-weight:bold"></span></td>
+      <td><span style="font-weight:bold"></span></td>
+      <td></td>
+      <td class="action-buttons">
+        <button class="btn btn-secondary" data-action="edit">✏️ Rediger</button>
+        <button class="btn btn-danger" data-action="delete">🗑️ Slett</button>
+      </td>`;
+    return tr;
+  }
+
+  function fillRow(tr, d) {
+    const cells = tr.cells;
+    cells[0].textContent = d.unitNumber;
+    cells[1].textContent = d.destination;
+    cells[2].textContent = d.time;
+    cells[3].textContent = d.gate;
+    const [icon, type] = cells[4].children;
+    icon.textContent = TYPE_ICONS[d.type] || '';
+    type.textContent = d.type;
+    type.style.color = TYPE_COLORS[d.type] || DEFAULT_TYPE_COLOR;
+    const status = cells[5].firstElementChild;
+    status.textContent = d.status;
+    status.style.color = STATUS_COLORS[d.status] || DEFAULT_STATUS_COLOR;
+    if (d.comment) cells[6].textContent = d.comment;
+    else cells[6].innerHTML = '<em>Ingen</em>';
+  }
+
+  class DepartureTable {
+    constructor(tbody, { onEdit, onDelete } = {}) {
+      this.tbody = tbody;
+      this.rows = new Map(); // id -> { record, key, tr, rendered }, i ankomstrekkefølge
+      this.term = '';
+      this.destination = '';
+      this.sort = { key: null, asc: true };
+      this._orderDirty = true; // utvalg eller rekkefølge må regnes ut på nytt
+      this._dirty = new Set(); // id-er med nytt innhold
+      this._frame = null;
+
+      // Én lytter for alle knappene i tabellen
+      tbody.addEventListener('click', e => {
+        const button = e.target.closest('button[data-action]');
+        if (!button) return;
+        const id = Number(button.closest('tr').dataset.id);
+        const handler = button.dataset.action === 'edit' ? onEdit : onDelete;
+        if (handler) handler(id);
+      });
+    }
+
+    get size() {
+      return this.rows.size;
+    }
+
+    upsert(record) {
+      const row = this.rows.get(record.id);
+      if (row) {
+        if (sameRecord(row.record, record)) return;
+        const old = row.record;
+        const sortKey = this.sort.key;
+        if (old.unitNumber !== record.unitNumber || old.destination !== record.destination ||
+            (sortKey && old[sortKey] !== record[sortKey])) {
+          this._orderDirty = true;
+        }
+        row.record = record;
+        row.key = searchKey(record);
+      } else {
+        this.rows.set(record.id, { record, key: searchKey(record), tr: null, rendered: null });
+        this._orderDirty = true;
+      }
+      this._dirty.add(record.id);
+      this._schedule();
+    }
+
+    remove(id) {
+      const row = this.rows.get(id);
+      if (!row) return;
+      this.rows.delete(id);
+      if (row.tr) row.tr.remove(); // resten av rekkefølgen er uendret
+    }
+
+    reset(records) {
+      this.rows.clear();
+      this._dirty.clear();
+      this.tbody.textContent = '';
+      records.forEach(r => this.upsert(r));
+      this._orderDirty = true;
+      this._schedule();
+    }
+
+    setFilter(term, destination) {
+      term = term.toLowerCase();
+      if (term === this.term && destination === this.destination) return;
+      this.term = term;
+      this.destination = destination;
+      this._orderDirty = true;
+      this._schedule();
+    }
+
+    setSort(key, asc) {
+      this.sort = { key, asc };
+      this._orderDirty = true;
+      this._schedule();
+    }
+
+    _schedule() {
+      if (this._frame !== null) return;
+      this._frame = requestAnimationFrame(() => {
+        this._frame = null;
+        this.render();
+      });
+    }
+
+    _matches(row) {
+      return (this.term === '' || row.key.includes(this.term)) &&
+        (this.destination === '' || row.record.destination === this.destination);
+    }
+
+    render() {
+      if (this._orderDirty) {
+        this._orderDirty = false;
+        const visible = [];
+        this.rows.forEach(row => { if (this._matches(row)) visible.push(row); });
+        const key = this.sort.key;
+        if (key) {
+          const dir = this.sort.asc ? 1 : -1;
+          visible.sort((a, b) => {
+            const av = a.record[key] || '', bv = b.record[key] || '';
+            return av < bv ? -dir : av > bv ? dir : 0;
+          });
+        }
+        this._reconcile(visible);
+      }
+      this._dirty.forEach(id => {
+        const row = this.rows.get(id);
+        if (row && row.tr && row.tr.isConnected && row.rendered !== row.record) {
+          fillRow(row.tr, row.record);
+          row.rendered = row.record;
+        }
+      });
+      this._dirty.clear();
+    }
+
+    // Sørger for at tbody inneholder nøyaktig `visible`, i den rekkefølgen,
+    // med så få flyttinger som mulig.
+    _reconcile(visible) {
+      const tbody = this.tbody;
+      const keep = new Set();
+      visible.forEach(row => { if (row.tr) keep.add(row.tr); });
+      Array.from(tbody.children).forEach(tr => { if (!keep.has(tr)) tr.remove(); });
+
+      let cursor = tbody.firstChild;
+      for (const row of visible) {
+        if (!row.tr) row.tr = createRow(row.record.id);
+        if (row.rendered !== row.record) {
+          fillRow(row.tr, row.record);
+          row.rendered = row.record;
+        }
+        if (row.tr === cursor) cursor = cursor.nextSibling;
+        else tbody.insertBefore(row.tr, cursor);
+      }
+    }
+  }
+
+  function debounce(fn, wait) {
+    let timer = null;
+    return (...args) => {
+      clearTimeout(timer);
+      timer = setTimeout(() => fn(...args), wait);
+    };
+  }
+
+  global.DepartureTable = DepartureTable;
+  global.debounce = debounce;
+})(window);